@@ -1,7 +1,17 @@
 import ast
+import sys
+import hashlib
+import json
+import pickle
+import sqlite3
+import time
 import warnings
+import zlib
 import os, os.path, re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
 
 import numpy as np
 import pandas as pd
@@ -9,6 +19,7 @@ from pandas import read_csv
 
 from tqdm import tqdm
 
+import estnltk
 from estnltk import Text, Layer
 from estnltk.taggers import Tagger
 from estnltk_core.taggers import MultiLayerTagger
@@ -18,11 +29,14 @@ class RecallEstimator:
     '''Recall estimator for named entity recognizers.
     '''
 
-    def __init__(self, description_file, method='precise_recall', add_correct_count=True):
+    def __init__(self, description_file, method='precise_recall', add_correct_count=True, cache_dir=None, 
+                       result_store=None, profile=False, streaming=False):
         '''
         Loads evaluation benchmark data based on given data description_file. 
         Validates data (via the function validate_evaluation_data(...) below) 
         and throws an exception in case of any issues.
+        If cache_dir is provided, then uses the on-disk cache of preprocessed 
+        benchmark data (see load_evaluation_data_cached(...) below).
         
         Parameters
         ----------
@@ -30,30 +44,94 @@ class RecallEstimator:
             Name of the file describing evaluation sub samples and corresponding statistics. 
             Must be a CSV format file.
         method: str
-            Evaluation method. Currently, only one method has been implemented: 'precise_recall';
+            Evaluation method, which determines how confidence intervals of recall estimates 
+            are found. Supported methods: 
+            * 'precise_recall' (default) -- normal approximation; 
+            * 'exact_convolution' -- exact distribution via FFT-based convolution of 
+              per-population binomial distributions; 
+            * 'bootstrap' -- stratified bootstrap; 
         add_correct_count: bool
             If True (default), then counts of correct/incorrect spans will be added to the 
             evaluation results. Otherwise, evaluation results contains only 'Recall' and 
             'Recall-95CI%'. 
             Default: True.
+        cache_dir: str
+            (Optional) Directory of the preprocessed benchmark cache. If provided, then 
+            the benchmark data (along with prerequisite layers) is loaded from the cache, 
+            and validation is skipped if the benchmark files have not changed since the 
+            cache was created. 
+            Default: None (cache is not used)
+        result_store: Union[str, EvaluationResultStore]
+            (Optional) Persistent store of per-item evaluation results (or name of its 
+            SQLite database file). If provided, then per-item correctness vectors of all 
+            evaluations are saved into the store, and can later be re-scored without 
+            re-tagging via rescore_stored_evaluations(...). 
+            Default: None (per-item results are not stored)
+        profile: bool
+            If True, then profiles evaluations: throughput (sentences per second), percentiles 
+            of per-sentence tagger latencies (p50/p95/p99, in milliseconds) and peak RSS are 
+            added to the evaluation results (and to the leaderboard). Detailed wall-clock and 
+            CPU times of evaluation stages are recorded in self.profiling_reports. 
+            Default: False
+        streaming: bool
+            If True, then uses the streaming (low-memory) mode: the benchmark data is only 
+            validated, and gold standard items are loaded lazily from the recall set files 
+            during each evaluation, and dropped right after scoring (so self.gold_standard 
+            is None). The mode cannot be used together with cache_dir, and evaluations 
+            cannot use workers or dedup. 
+            Default: False
         '''
         if not os.path.isfile(description_file):
             raise Exception(f'(!) Non-existent or bad description file name {description_file!r}.')
         self.description_file = description_file
-        self.gold_standard = \
-            load_evaluation_data(description_file=self.description_file, validate=True)
-        print(f'Loaded evaluation benchmark of size {len(self.gold_standard)}.')
+        self.streaming = streaming
+        if streaming:
+            if cache_dir is not None:
+                raise ValueError('(!) Streaming mode cannot be used together with cache_dir.')
+            validate_evaluation_data(description_file=self.description_file)
+            self.gold_standard = None
+        elif cache_dir is not None:
+            self.gold_standard = \
+                load_evaluation_data_cached(description_file=self.description_file, cache_dir=cache_dir)
+        else:
+            self.gold_standard = \
+                load_evaluation_data(description_file=self.description_file, validate=True)
+        # Population weights do not change between evaluations: calculate them only once
+        self.populations, self._pop_weights, self._pop_positives = \
+            population_weights(description_file=self.description_file)
+        if streaming:
+            desc = read_csv(self.description_file)
+            self._pop_codes = np.repeat(encode_populations(desc.population, self.populations), 
+                                        desc.positive.to_numpy())
+        else:
+            self._pop_codes = encode_populations(self.gold_standard.population, self.populations)
+        print(f'Loaded evaluation benchmark of size {len(self._pop_codes)}.')
         self.all_eval_results = {}
         self.eval_counter = 0
         self.add_correct_count = add_correct_count
-        supported_methods = ['precise_recall']
-        if method not in supported_methods:
-            raise ValueError(f'(!) Unexpected method={method!r}. Supported methods: {supported_methods!r}')
+        if method not in RECALL_ESTIMATION_METHODS:
+            raise ValueError(f'(!) Unexpected method={method!r}. Supported methods: {RECALL_ESTIMATION_METHODS!r}')
         self.method = method
         self.gold_layer = '_gold_ner'
+        if isinstance(result_store, str):
+            result_store = EvaluationResultStore(result_store)
+        self.result_store = result_store
+        self.profile = profile
+        self.profiling_reports = {}
+        self._item_keys = None
+        if self.result_store is not None:
+            if streaming:
+                self._item_keys = stream_gold_item_keys(description_file=self.description_file)
+            else:
+                self._item_keys = gold_item_keys(self.gold_standard, gold_layer=self.gold_layer)
+            # Per-item correctness does not depend on population weights, so the 
+            # fingerprint of stored evaluations leaves out the description file
+            self._fingerprint = benchmark_fingerprint(description_file=self.description_file, 
+                                                      include_description=False)
 
     def evaluate_tagger(self, tagger, eval_name=None, auto_layer=None, overwrite_existing=True, 
-                              ignore_errors=False, verbose=False):
+                              ignore_errors=False, verbose=False, workers=None, dedup=False, 
+                              output_cache=None):
         '''
         Evaluates tagger on different sub samples / populations, calculates recall on 
         each sub sample, and a weighted average of recalls as the estimate of the recall 
@@ -63,8 +141,11 @@ class RecallEstimator:
         
         Parameters
         ----------
-        tagger: Union[Tagger, MultiLayerTagger]
-            Tagger to be evaluated on the benchmark data.
+        tagger: Union[Tagger, MultiLayerTagger, Callable]
+            Tagger to be evaluated on the benchmark data. If workers > 1, then this 
+            can also be a function without arguments that builds the tagger (in each 
+            worker process; the function must be picklable, e.g. a module level function 
+            or a functools.partial). In that case, eval_name and auto_layer must be provided.
         eval_name: str
             Name/description of tagger's evaluation. If not provided (default), then 
             defaults to f'{tagger.output_layer}_#{evaluation_count}', where 
@@ -86,6 +167,21 @@ class RecallEstimator:
             If True, then prints out detailed information about populations, including the 
             the number of correct results in each population.
             Default: False
+        workers: int
+            (Optional) If workers > 1, then the benchmark data is split into shards and 
+            tagged in parallel by a pool of workers processes. Note that in this case, 
+            tagger's output layers will not be added to texts of self.gold_standard.
+            Default: None (tag in the current process)
+        dedup: bool
+            If True, then the tagger is applied only once on each unique sentence of the 
+            benchmark data, and all gold spans of the sentence are scored against the 
+            output. Cannot be used together with workers > 1.
+            Default: False
+        output_cache: TaggerOutputCache
+            (Optional) On-disk cache of tagger outputs. If provided, then only sentences 
+            missing from the cache are tagged, and their outputs are added to the cache. 
+            Cannot be used together with workers > 1 or in the streaming mode.
+            Default: None
 
         Returns
         -------
@@ -93,38 +189,255 @@ class RecallEstimator:
             A dictionary with evaluation results (minimum keys: 'Recall', 'Recall-95CI%'). 
         '''
         # Evaluate tagger on sub-samples
+        profiler = EvaluationProfiler() if self.profile else None
+        if self.streaming:
+            if dedup or (workers is not None and workers > 1) or output_cache is not None:
+                raise ValueError('(!) Streaming mode cannot be used together with workers, dedup or output_cache.')
+            pop_codes, correct_matrix = \
+                evaluate_benchmark_streaming(self.description_file, [tagger], self.populations, 
+                                             auto_layers=[auto_layer], gold_layer=self.gold_layer, 
+                                             overwrite_existing=overwrite_existing, 
+                                             ignore_errors=ignore_errors, profilers=[profiler])
+            self.eval_counter += 1
+            eval_name = self._construct_eval_name(tagger, eval_name)
+            self.record_eval_results([eval_name], correct_matrix, population_codes=pop_codes, verbose=verbose)
+            if profiler is not None:
+                self._record_profiling_results(eval_name, profiler)
+            return self.all_eval_results[eval_name].copy()
         eval_result = evaluate_benchmark(self.gold_standard, tagger, auto_layer=auto_layer, 
                                          gold_layer=self.gold_layer, method=self.method, 
                                          overwrite_existing=overwrite_existing, 
-                                         ignore_errors=ignore_errors)
+                                         ignore_errors=ignore_errors, workers=workers, dedup=dedup, 
+                                         profiler=profiler, output_cache=output_cache)
         self.eval_counter += 1
         eval_name = self._construct_eval_name(tagger, eval_name)
         # Find & record recall estimate
-        self.all_eval_results[eval_name] = \
-            find_recall_estimate(eval_result, description_file=self.description_file, verbose=verbose)
-        if self.add_correct_count:
-            # Add correct/incorrect counts
-            self.all_eval_results[eval_name]['correct'] = \
-                int(eval_result['correct'].value_counts()['yes'])
-            self.all_eval_results[eval_name]['incorrect'] = \
-                int(eval_result['correct'].value_counts()['no'])
+        # (eval_result is aligned with the rows of self.gold_standard)
+        correct_vector = (eval_result['correct'].to_numpy() == 'yes')
+        self.record_eval_results([eval_name], correct_vector, verbose=verbose)
+        if profiler is not None:
+            self._record_profiling_results(eval_name, profiler)
         return self.all_eval_results[eval_name].copy()
 
+    def evaluate_taggers(self, taggers, eval_names=None, auto_layers=None, overwrite_existing=True, 
+                               ignore_errors=False, verbose=False):
+        '''
+        Evaluates multiple taggers in a single pass over the benchmark data. Prerequisite 
+        layers of each sentence are computed only once and shared by all the taggers. 
+        Records evaluation results of all taggers and returns a dictionary mapping 
+        evaluation names to the results. 
+        
+        Parameters
+        ----------
+        taggers: List[Union[Tagger, MultiLayerTagger]]
+            Taggers to be evaluated on the benchmark data. Output layers of the taggers 
+            must have distinct names.
+        eval_names: List[str]
+            (Optional) Names/descriptions of taggers' evaluations. If not provided (default), 
+            then names are constructed as in evaluate_tagger(...). 
+        auto_layers: List[str]
+            (Optional) Names of the taggers' output layers. If not provided (default), 
+            then attempts to detect the layer names automagically. 
+        overwrite_existing: bool
+            Whether existing layers will be removed in case the benchmark data has 
+            already been tagged by the taggers (see evaluate_tagger(...) for details).
+            Default: True.
+        ignore_errors: bool
+            If True, then ignores tagger errors/exceptions (see evaluate_tagger(...) for details). 
+            Default: False.
+        verbose: bool
+            If True, then prints out detailed information about populations.
+            Default: False
+
+        Returns
+        -------
+        Dict
+            A dictionary mapping evaluation names to evaluation results. 
+        '''
+        if eval_names is None:
+            eval_names = [None] * len(taggers)
+        if len(eval_names) != len(taggers):
+            raise ValueError(f'(!) Number of eval_names ({len(eval_names)}) does not match the '+\
+                             f'number of taggers ({len(taggers)}).')
+        profilers = [EvaluationProfiler() for tagger in taggers] if self.profile else None
+        if self.streaming:
+            pop_codes, correct_matrix = \
+                evaluate_benchmark_streaming(self.description_file, taggers, self.populations, 
+                                             auto_layers=auto_layers, gold_layer=self.gold_layer, 
+                                             overwrite_existing=overwrite_existing, 
+                                             ignore_errors=ignore_errors, profilers=profilers)
+        else:
+            correct_matrix = evaluate_benchmark_multi(self.gold_standard, taggers, auto_layers=auto_layers, 
+                                                      gold_layer=self.gold_layer, 
+                                                      overwrite_existing=overwrite_existing, 
+                                                      ignore_errors=ignore_errors, profilers=profilers)
+        constructed_names = []
+        for tagger, eval_name in zip(taggers, eval_names):
+            self.eval_counter += 1
+            constructed_names.append( self._construct_eval_name(tagger, eval_name) )
+        results = self.record_eval_results(constructed_names, correct_matrix, verbose=verbose)
+        if profilers is not None:
+            for eval_name, profiler in zip(constructed_names, profilers):
+                self._record_profiling_results(eval_name, profiler)
+        return {eval_name: result.copy() for eval_name, result in results.items()}
+
+    def record_eval_results(self, eval_names, correct_matrix, population_codes=None, verbose=False):
+        '''
+        Finds recall estimates of multiple taggers in one vectorized pass and records the 
+        results under eval_names. 
+        
+        Parameters
+        ----------
+        eval_names: List[str]
+            Names of the evaluations, one for each row of correct_matrix.
+        correct_matrix: array_like
+            Binomial correctness matrix of shape (taggers, items) (1==match, 0==mismatch).
+        population_codes: array_like
+            (Optional) Population code of each item (index in self.populations). 
+            If not provided (default), then the items are assumed to be aligned 
+            with the rows of self.gold_standard. 
+        verbose: bool
+            If True, then prints out detailed information about populations.
+            Default: False
+
+        Returns
+        -------
+        Dict
+            A dictionary mapping eval_names to evaluation results.
+        '''
+        correct_matrix = np.atleast_2d(np.asarray(correct_matrix, dtype=bool))
+        if population_codes is None:
+            population_codes = self._pop_codes
+        if len(eval_names) != correct_matrix.shape[0]:
+            raise ValueError(f'(!) Number of eval_names ({len(eval_names)}) does not match the '+\
+                             f'number of rows in correct_matrix ({correct_matrix.shape[0]}).')
+        if self.result_store is not None and len(population_codes) != len(self._item_keys):
+            raise ValueError(f'(!) Unable to store evaluation results: number of items '+\
+                             f'({len(population_codes)}) does not match the number of '+\
+                             f'gold standard items ({len(self._item_keys)}).')
+        recalls, lowers, uppers = estimate_recalls(correct_matrix, population_codes, self._pop_weights, 
+                                                   positives=self._pop_positives, method=self.method)
+        if self.result_store is not None:
+            for i, eval_name in enumerate(eval_names):
+                self.result_store.add_evaluation(eval_name, self._item_keys, correct_matrix[i], 
+                                                 benchmark_fingerprint=self._fingerprint)
+        correct_counts = correct_matrix.sum(axis=1)
+        for i, eval_name in enumerate(eval_names):
+            if verbose:
+                _print_population_details(correct_matrix[i], population_codes, self.populations, self._pop_weights)
+            self.all_eval_results[eval_name] = \
+                {'Recall': float(recalls[i]), 'Recall-95CI%': (float(lowers[i]), float(uppers[i]))}
+            if self.add_correct_count:
+                # Add correct/incorrect counts
+                self.all_eval_results[eval_name]['correct'] = int(correct_counts[i])
+                self.all_eval_results[eval_name]['incorrect'] = int(correct_matrix.shape[1] - correct_counts[i])
+        return {eval_name: self.all_eval_results[eval_name] for eval_name in eval_names}
+
+    def evaluate_tagger_all_modes(self, tagger, eval_name=None, auto_layer=None, overwrite_existing=True, 
+                                        ignore_errors=False, verbose=False, output_cache=None):
+        '''
+        Evaluates tagger in all span MATCHING_MODES ('exact', 'boundary', 'partial', 
+        'overlap', 'type') in one pass: each unique sentence is tagged only once and 
+        its gold spans are matched in all modes. Records results of each mode under 
+        f'{eval_name}[{mode}]' and returns a DataFrame with the results of all modes. 
+        For parameters, see evaluate_tagger(...). 
+        Note that only the 'exact' mode corresponds to the evaluation of evaluate_tagger(...), 
+        lenient modes are meant for diagnostics.
+        '''
+        if self.streaming:
+            raise ValueError('(!) Evaluation in all matching modes is not available in the streaming mode.')
+        profiler = EvaluationProfiler() if self.profile else None
+        correct_matrix = evaluate_benchmark_all_modes(self.gold_standard, tagger, auto_layer=auto_layer, 
+                                                      gold_layer=self.gold_layer, 
+                                                      overwrite_existing=overwrite_existing, 
+                                                      ignore_errors=ignore_errors, 
+                                                      output_cache=output_cache, profiler=profiler)
+        self.eval_counter += 1
+        eval_name = self._construct_eval_name(tagger, eval_name)
+        mode_names = [f'{eval_name}[{mode}]' for mode in MATCHING_MODES]
+        results = self.record_eval_results(mode_names, correct_matrix, verbose=verbose)
+        if profiler is not None:
+            self._record_profiling_results(mode_names[0], profiler)
+        return pd.DataFrame.from_dict(results, orient='index')
+
+    def evaluate_prediction_file(self, predictions_file, eval_name, allow_missing=False, verbose=False):
+        '''
+        Evaluates precomputed tagger predictions, which were produced outside of this 
+        estimator (e.g. in batch jobs on other machines, see export_tagger_predictions(...)). 
+        Records evaluation results under eval_name and returns a dictionary with the 
+        results (the same as evaluate_tagger(...) would produce for the tagger). 
+        
+        Parameters
+        ----------
+        predictions_file: str
+            JSONL file, each line containing a JSON object with keys "sentence_hash" 
+            (sha1 hex digest of the sentence text) and "spans" (list of [start, end, nertag]).
+        eval_name: str
+            Name/description of the evaluation.
+        allow_missing: bool
+            If True, then sentences without predictions are taken as sentences where no 
+            entities were detected. If False (default), then missing predictions raise 
+            ValueError. 
+        verbose: bool
+            If True, then prints out detailed information about populations.
+            Default: False
+        '''
+        predictions = load_predictions(predictions_file)
+        correct_vector = evaluate_predictions(self.description_file, predictions, allow_missing=allow_missing)
+        self.eval_counter += 1
+        self.record_eval_results([eval_name], correct_vector, verbose=verbose)
+        return self.all_eval_results[eval_name].copy()
+
+    def _record_profiling_results(self, eval_name, profiler):
+        ''' [Internal] Adds profiling summary to the evaluation results of eval_name. '''
+        self.all_eval_results[eval_name].update( profiler.summary() )
+        self.profiling_reports[eval_name] = profiler.report()
+
     def _construct_eval_name(self, tagger, eval_name):
         ''' [Internal] Constructs the name of tagger's evaluation if eval_name is None. '''
         if isinstance(eval_name, str):
             return eval_name
         else:
             # Construct eval_name based on tagger's output layer name and counter
-            if isinstance(tagger, Tagger):
-                eval_name = tagger.output_layer
-            elif isinstance(tagger, MultiLayerTagger):
-                eval_name = tagger.output_layers[0]
-            else:
-                raise TypeError(f'(!) Unexpected tagger type {type(tagger)!r}, '+\
-                                 'unable to detect name of the output layer.')
+            eval_name = _detect_output_layer(tagger)
             return f'{eval_name}_#{self.eval_counter}'
 
+    def rescore_stored_evaluations(self, eval_names=None, verbose=False):
+        '''
+        Re-scores evaluations from the result store under the current data description 
+        (e.g. after occurrence counts in the description file have been updated), 
+        without re-tagging. Items are matched by their keys (see gold_item_keys(...)), 
+        so the stored evaluations must cover all items of the current benchmark; 
+        evaluations missing some of the items are skipped with a warning. 
+        Evaluations recorded on a different version of the recall set files or estnltk 
+        (see benchmark_fingerprint(..., include_description=False)) are also skipped 
+        with a warning. 
+        If the store contains multiple evaluations with the same name, then the latest 
+        one is used. Records the results and returns the leaderboard.
+        '''
+        if self.result_store is None:
+            raise Exception('(!) Unable to rescore: this estimator has no result_store.')
+        names, correct_matrix, covered = \
+            self.result_store.load_correct_matrix(self._item_keys, eval_names=eval_names)
+        stored_fingerprints = self.result_store.get_benchmark_fingerprints(eval_names=names)
+        for i, eval_name in enumerate(names):
+            if not covered[i]:
+                warnings.warn(f'(!) Stored evaluation {eval_name!r} does not cover all items of the '+\
+                              f'current benchmark. Skipping the evaluation.')
+            elif stored_fingerprints.get(eval_name) != self._fingerprint:
+                warnings.warn(f'(!) Stored evaluation {eval_name!r} was recorded on a different '+\
+                              f'benchmark (fingerprint mismatch). Skipping the evaluation.')
+                covered[i] = False
+        names = [eval_name for eval_name, ok in zip(names, covered) if ok]
+        if names:
+            # Record results without storing them again
+            result_store, self.result_store = self.result_store, None
+            try:
+                self.record_eval_results(names, correct_matrix[covered], verbose=verbose)
+            finally:
+                self.result_store = result_store
+        return self.leaderboard()
+
     def leaderboard(self, order_by_recall=True):
         '''Returns leaderboard of the evaluation (pandas.DataFrame). 
            If order_by_recall is True (default), then the table is 
@@ -143,6 +456,9 @@ class RecallEstimator:
            Expects the csv_file data to be in the same format as the output 
            data of the call: 
                self.leaderboard(order_by_recall=False).to_csv( ... )
+           Profiling summaries (PROFILING_COLUMNS) are imported if the csv_file 
+           has them. Profiling reports of stages are not part of the leaderboard, 
+           so they are not restored.
         '''
         leaderboard_data = read_csv(csv_file)
         # Validate input
@@ -160,7 +476,7 @@ class RecallEstimator:
             recall = row['Recall']
             recall_ci = row['Recall-95CI%'].strip('"')
             if re.match(r'^\([0-9]+(\.[0-9]+)?, [0-9]+(\.[0-9]+)?\)$', recall_ci):
-                recall_ci = eval( recall_ci )
+                recall_ci = ast.literal_eval( recall_ci )
             else:
                 raise Exception(f'(!) Unexpected "Recall-95CI%" value {recall_ci}. '+\
                                  'Expected a tuple of 2 floats (a confidence interval).')
@@ -174,20 +490,105 @@ class RecallEstimator:
             if self.add_correct_count:
                 self.all_eval_results[eval_name]['correct'] = row['correct']
                 self.all_eval_results[eval_name]['incorrect'] = row['incorrect']
+            for column in PROFILING_COLUMNS:
+                if column in leaderboard_data.columns and pd.notna(row[column]):
+                    self.all_eval_results[eval_name][column] = float(row[column])
 
 
 # =================================================================
 #  Validate and summarize evaluation data
 # =================================================================
 
-def validate_evaluation_data(description_file='data_description.csv'):
+class EvaluationDataValidationError(ValueError):
+    '''Raised if validation of evaluation data fails. 
+       Attribute report contains all detected issues: a dictionary mapping 
+       file names to lists of error messages.
+    '''
+
+    def __init__(self, report):
+        self.report = report
+        error_count = sum(len(errors) for errors in report.values())
+        messages = [f'(!) Validation of evaluation data failed with {error_count} error(s):']
+        for filename, errors in report.items():
+            for error in errors:
+                messages.append(f'  {filename}: {error}')
+        super().__init__('\n'.join(messages))
+
+
+def _file_sha256(filename):
+    ''' [Internal] Calculates sha256 hex digest of the file's content. '''
+    with open(filename, 'rb') as in_f:
+        return hashlib.sha256(in_f.read()).hexdigest()
+
+def _validate_recall_set_file(filename, positive):
+    ''' [Internal] Validates NE annotations of a single recall set file. 
+        Returns a list of detected errors (empty list if the file is valid). '''
+    errors = []
+    try:
+        data = read_csv(filename)
+    except Exception as csv_parsing_err:
+        return [f'Bad input file format: unable to open {filename!r} as a CSV file: {csv_parsing_err}']
+    if len(data.text) != positive:
+        errors.append(f'Number of samples in file {filename!r} ({len(data.text)}) does '+\
+                      f'not match with the number of samples in the description ({positive}).')
+    # Validate NE annotations
+    for index, (text_str, span) in enumerate(zip(data.text, data.span)):
+        try:
+            span = ast.literal_eval( span )
+        except Exception as span_parsing_err:
+            errors.append(f'{index}: unable to parse span {span!r}: {span_parsing_err}')
+            continue
+        # Example span: "{'start': 0, 'end': 13, 'text': 'Inglise kanal', 'labels': ['LOC']}"
+        missing_attributes = [attr for attr in ['start', 'end', 'labels', 'text'] if attr not in span]
+        if missing_attributes:
+            errors.append(f'{index}: span is missing attributes {missing_attributes!r}')
+            continue
+        if not isinstance(span['labels'], list):
+            errors.append(f'{index}: span "labels" is not a list')
+        ner_phrase = text_str[span['start']:span['end']]
+        if len(span['text']) > 0 and ner_phrase != span['text']:
+            errors.append(f'{index}: span.text ({span["text"]!r}) != text@span_location ({ner_phrase!r}).')
+        elif len(span['text']) == 0:
+            errors.append(f'{index}: span.text cannot be "".')
+    return errors
+
+def _load_validation_cache(cache_file):
+    ''' [Internal] Loads validation verdicts recorded in cache_file. '''
+    if cache_file is not None and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as in_f:
+                return json.load(in_f)
+        except Exception as cache_err:
+            warnings.warn(f'(!) Unable to load validation cache {cache_file!r}: {cache_err}')
+    return {}
+
+def _save_validation_cache(cache_file, cache):
+    ''' [Internal] Saves validation verdicts into cache_file. '''
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    tmp_cache_file = f'{cache_file}.{os.getpid()}.tmp'
+    with open(tmp_cache_file, 'w', encoding='utf-8') as out_f:
+        json.dump(cache, out_f, ensure_ascii=False, indent=1)
+    os.replace(tmp_cache_file, cache_file)
+
+def validate_evaluation_data(description_file='data_description.csv', cache_file=None, workers=None):
     '''
     Validates recall benchmark evaluation data:
     * Data description is in right format;
     * Data description is consistent with the benchmark files;
     * No duplicates in the files;
     * Input files are in the same format;
-    Throws an exception in case of detected inconsistencies.
+    Collects all detected inconsistencies and throws an EvaluationDataValidationError 
+    (which contains a structured report of all errors) in case of any issues.
+    
+    If cache_file is provided, then validation is incremental: a sha256 hash of each 
+    recall set file is recorded in the cache_file along with the validation verdict, 
+    and files that have not changed since the last validation are not re-validated. 
+    If workers > 1, then changed files are validated in parallel in a pool of worker 
+    processes. 
+    Returns the validation report: a dictionary mapping validated file names to lists 
+    of errors (all lists are empty if validation succeeds).
     '''
     # Validate data description's format
     try:
@@ -202,48 +603,47 @@ def validate_evaluation_data(description_file='data_description.csv'):
     if missing_columns:
         raise ValueError(f'(!) CSV file {description_file!r} is missing columns {missing_columns!r}.')
     # Validate data description's content
+    report = {description_file: []}
     seen_files = set()
-    last_population = None
-    populations_count = defaultdict(int)
-    for filename, population, positive in zip(desc.file, desc.population, desc.positive):
-        # Validate population files ordering
-        populations_count[population] += 1
-        if populations_count[population] > 1 and last_population != population:
-            # Validate that all examples of a population are consecutive. 
-            # (If not, then our weight calculations do not work as expected)
-            raise ValueError(f'(!) Non-consecutive files of the population {population!r}: '+
-                             f'unexpectedly previous file is from another population {last_population!r} '+
-                             f'in {description_file!r}.')
+    files_to_validate = []
+    for filename, positive in zip(desc.file, desc.positive):
         # Validate input files
         if filename in seen_files:
-            raise ValueError(f'(!) Duplicate file {filename!r} in evaluation benchmark {description_file!r}.')
-        if not os.path.isfile(filename):
-            raise Exception(f'(!) Non-existent or bad file name {filename!r} in evaluation benchmark {description_file!r}.')
-        try:
-            data = read_csv(filename)
-        except Exception as csv_parsing_err:
-            raise ValueError(f'(!) Bad input file format: unable to open {filename!r} as a CSV file: ') from csv_parsing_err
-        if len(data.text) != positive:
-            raise ValueError(f'(!) Number of samples in file {filename!r} ({len(data.text)}) does '+\
-                             f'not match with the number of samples in {description_file!r} ({positive}).')
-        index = 0
-        # Validate NE annotations
-        for text_str, span in zip(data.text, data.span):
-            span = ast.literal_eval( span )
-            # Example span: "{'start': 0, 'end': 13, 'text': 'Inglise kanal', 'labels': ['LOC']}"
-            assert 'start' in span,  f'(!) {filename!r}:{index}: span is missing "start" attribute'
-            assert 'end' in span,    f'(!) {filename!r}:{index}: span is missing "end" attribute'
-            assert 'labels' in span, f'(!) {filename!r}:{index}: span is missing "labels" attribute'
-            assert 'text' in span,   f'(!) {filename!r}:{index}: span is missing "text" attribute'
-            assert isinstance(span['labels'], list), f'(!) {filename!r}:{index}: span "labels" is not a list'
-            ner_phrase = text_str[span['start']:span['end']]
-            if len(span['text']) > 0 and ner_phrase != span['text']:
-                raise Exception(f'(!) {filename!r}:{index}: span.text ({span["text"]}!r) != text@span_location ({ner_phrase}!r).')
-            elif len(span['text']) == 0:
-                raise Exception(f'(!) {filename!r}:{index}: span.text cannot be "".')
-            index += 1
+            report[description_file].append(f'Duplicate file {filename!r} in evaluation benchmark.')
+            continue
         seen_files.add( filename )
-        last_population = population
+        if not os.path.isfile(filename):
+            report[description_file].append(f'Non-existent or bad file name {filename!r} in evaluation benchmark.')
+            continue
+        files_to_validate.append( (filename, int(positive)) )
+    # Skip files that have not changed since the last validation
+    cache = _load_validation_cache(cache_file)
+    file_hashes = {}
+    changed_files = []
+    for filename, positive in files_to_validate:
+        file_hashes[filename] = _file_sha256(filename)
+        cached = cache.get(filename)
+        if cached is not None and cached.get('sha256') == file_hashes[filename] and \
+           cached.get('positive') == positive:
+            report[filename] = list(cached['errors'])
+        else:
+            changed_files.append( (filename, positive) )
+    # Validate changed files
+    if workers is not None and workers > 1 and len(changed_files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            verdicts = list(executor.map(_validate_recall_set_file, *zip(*changed_files)))
+    else:
+        verdicts = [_validate_recall_set_file(filename, positive) for filename, positive in changed_files]
+    for (filename, positive), errors in zip(changed_files, verdicts):
+        report[filename] = errors
+        cache[filename] = {'sha256': file_hashes[filename], 'positive': positive, 'errors': errors}
+    if cache_file is not None and changed_files:
+        _save_validation_cache(cache_file, cache)
+    # Report all detected errors
+    failed = {filename: errors for filename, errors in report.items() if errors}
+    if failed:
+        raise EvaluationDataValidationError(failed)
+    return report
 
 
 def corpus_statistics(description_file='data_description.csv'):
@@ -256,74 +656,511 @@ def corpus_statistics(description_file='data_description.csv'):
     desc = read_csv(description_file, index_col=0)
     desc = desc.rename_axis('index')
     # Calculate the estimated number of positives for each population along with 95% CI
-    estimated_pos = []
-    estimated_lowers = []
-    estimated_uppers = []
-    for filename, population, positives, labelled, total in zip( desc.file, desc.population, \
-                                                                 desc.positive, desc.labelled, \
-                                                                 desc.occurences ):
-        estimated_pos.append( positives * total / labelled )
-        ones = positives * [1]
-        zeros = (labelled-positives) * [0]
-        ones.extend(zeros)
-        std_dev = np.std( np.array(ones) )
-        lower = (positives/labelled - 0.95 * std_dev / np.sqrt(labelled))*labelled
-        upper = (positives/labelled + 0.95 * std_dev / np.sqrt(labelled))*labelled
-        estimated_lowers.append( int(lower*total/labelled) )
-        estimated_uppers.append( int(upper*total/labelled) )
-    desc['estimated_positives'] = estimated_pos
-    desc['estimated_positives_lower'] = estimated_lowers
-    desc['estimated_positives_upper'] = estimated_uppers
-    # Calculate total estimated number of positives over all populations
-    total_estimated_positives = desc['estimated_positives'].sum()
-    #print(total_estimated_positives)
+    positives = desc['positive'].to_numpy(dtype=float)
+    labelled  = desc['labelled'].to_numpy(dtype=float)
+    total     = desc['occurences'].to_numpy(dtype=float)
+    # Standard deviation of a 0/1 vector with `positives` ones out of `labelled` 
+    # items has a closed form: sqrt(p*(1-p)), where p = positives/labelled
+    proportion = positives / labelled
+    std_dev = np.sqrt(proportion * (1.0 - proportion))
+    lower = (proportion - 0.95 * std_dev / np.sqrt(labelled))*labelled
+    upper = (proportion + 0.95 * std_dev / np.sqrt(labelled))*labelled
+    desc['estimated_positives'] = positives * total / labelled
+    desc['estimated_positives_lower'] = np.trunc(lower*total/labelled).astype(int)
+    desc['estimated_positives_upper'] = np.trunc(upper*total/labelled).astype(int)
     return desc
 
+
+def population_weights(description_file='data_description.csv'):
+    '''Calculates the weight of a single labelled positive item of each population, 
+       following the formula:
+       estimated_positives_in_population/(observed_positives_in_population*
+       total_estimated_positives_over_all_populations).
+       If a population is described by multiple files, then its positives and 
+       estimated positives are summed over the files. 
+       Returns a tuple (populations, weights, positives), where populations is 
+       a list of population names (in the order of their first appearance in 
+       the description_file), and weights and positives are numpy arrays aligned 
+       with the populations.
+    '''
+    corpus_stats = corpus_statistics(description_file=description_file)
+    grouped = corpus_stats.groupby('population', sort=False)[['positive', 'estimated_positives']].sum()
+    total_positives = grouped['estimated_positives'].sum()
+    positives = grouped['positive'].to_numpy(dtype=np.int64)
+    weights = grouped['estimated_positives'].to_numpy(dtype=float) / (positives * total_positives)
+    return list(grouped.index), weights, positives
+
+
+def encode_populations(population_labels, populations):
+    '''Converts a sequence of population names into an integer array of population 
+       codes (indexes of the populations list). Raises ValueError in case of an 
+       unknown population name.
+    '''
+    codes = pd.Categorical(np.asarray(population_labels, dtype=object), categories=populations).codes
+    if (codes < 0).any():
+        unknown = sorted(set(population_labels) - set(populations))
+        raise ValueError(f'(!) Unexpected populations {unknown!r}, not listed in the data description. '+\
+                         f'Known populations: {populations!r}')
+    return codes.astype(np.intp)
+
+
+def estimate_recalls(correct_matrix, population_codes, weights, positives=None, method='precise_recall'):
+    '''
+    Finds recall estimates (along with 95% confidence intervals) for multiple taggers 
+    in one vectorized pass. 
+    
+    Parameters
+    ----------
+    correct_matrix: array_like
+        Binomial correctness matrix of shape (taggers, items) (1==match, 0==mismatch). 
+        A one-dimensional vector is interpreted as results of a single tagger.
+    population_codes: array_like
+        Integer array of length items: population code of each item, i.e. index of the 
+        item's population in weights. Items of a population do not need to be consecutive.
+    weights: array_like
+        Weight of a single item of each population (see population_weights(...)).
+    positives: array_like
+        (Optional) Expected number of items in each population. If provided, then checks 
+        that item counts of all evaluated populations match the expected counts, and 
+        raises ValueError otherwise.
+    method: str
+        Method for finding confidence intervals: 
+        * 'precise_recall' (default) -- normal approximation of the standard error of 
+          the weighted sample mean;
+        * 'exact_convolution' -- quantiles of the exact distribution of the weighted sum 
+          of per-population binomial distributions (see convolution_confidence_intervals(...));
+        * 'bootstrap' -- percentiles of the stratified bootstrap distribution (see 
+          bootstrap_confidence_intervals(...));
+
+    Returns
+    -------
+    Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        Arrays of recalls, lower bounds and upper bounds of 95% confidence intervals, 
+        each of length taggers.
+    '''
+    correct_matrix = np.atleast_2d(np.asarray(correct_matrix, dtype=float))
+    population_codes = np.asarray(population_codes, dtype=np.intp)
+    weights = np.asarray(weights, dtype=float)
+    if correct_matrix.shape[1] != len(population_codes):
+        raise ValueError(f'(!) Correctness matrix has {correct_matrix.shape[1]} items, but '+\
+                         f'{len(population_codes)} population codes were given.')
+    if positives is not None:
+        item_counts = np.bincount(population_codes, minlength=len(weights))
+        mismatches = (item_counts > 0) & (item_counts != np.asarray(positives))
+        if mismatches.any():
+            raise ValueError(f'(!) Number of evaluated items {item_counts[mismatches].tolist()!r} does not '+\
+                             f'match the number of positives {np.asarray(positives)[mismatches].tolist()!r} '+\
+                             f'in populations {np.flatnonzero(mismatches).tolist()!r}.')
+    if method not in RECALL_ESTIMATION_METHODS:
+        raise ValueError(f'(!) Unexpected method={method!r}. Supported methods: {RECALL_ESTIMATION_METHODS!r}')
+    # Calculate sample means and conf intervals (for a 95% confidence level)
+    item_weights = weights[population_codes]
+    sample_means = correct_matrix @ item_weights
+    if method != 'precise_recall':
+        correct_counts = population_correct_counts(correct_matrix, population_codes, len(weights))
+        item_counts = np.bincount(population_codes, minlength=len(weights))
+        if method == 'exact_convolution':
+            lowers, uppers = convolution_confidence_intervals(correct_counts, item_counts, weights)
+        else:
+            lowers, uppers = bootstrap_confidence_intervals(correct_counts, item_counts, weights)
+        return sample_means, lowers, uppers
+    standard_errors = np.sqrt(sample_means * (1-sample_means) * np.sum(np.square(item_weights)))
+    return sample_means, sample_means - standard_errors * 1.96, sample_means + standard_errors * 1.96
+
+
+def population_correct_counts(correct_matrix, population_codes, n_populations):
+    '''Counts correct items of each population for each tagger. 
+       Returns an integer array of shape (taggers, n_populations).
+    '''
+    correct_matrix = np.atleast_2d(np.asarray(correct_matrix, dtype=float))
+    population_codes = np.asarray(population_codes, dtype=np.intp)
+    one_hot = np.zeros((len(population_codes), n_populations))
+    one_hot[np.arange(len(population_codes)), population_codes] = 1.0
+    return np.rint(correct_matrix @ one_hot).astype(np.int64)
+
+# =================================================================
+#  Persistent store of per-item evaluation results
+# =================================================================
+
+def gold_item_keys(gold_standard, gold_layer='_gold_ner'):
+    '''Constructs a key for each gold standard item (row of the gold_standard). 
+       The key is sha1 hex digest of the sentence text, gold span location and 
+       gold labels, so that it does not depend on the order of items or on the 
+       populations of the items.
+    '''
+    keys = []
+    for text_obj in gold_standard.text:
+        gold_span = text_obj[gold_layer][0]
+        keys.append( _item_key(text_obj.text, gold_span.start, gold_span.end, list(gold_span.labels)) )
+    return keys
+
+def _item_key(text_str, start, end, labels):
+    ''' [Internal] Constructs key of a gold standard item. '''
+    item_str = f'{text_str}\t{start}\t{end}\t{labels!r}'
+    return hashlib.sha1(item_str.encode('utf-8')).hexdigest()
+
+def stream_gold_item_keys(description_file='data_description.csv'):
+    '''Constructs keys of gold standard items (see gold_item_keys(...)) directly from 
+       recall set files listed in the description_file, without creating Text objects.
+    '''
+    return [_item_key(text_str, span['start'], span['end'], span['labels']) for population, text_str, span 
+            in _iter_recall_set_rows(description_file=description_file)]
+
+
+class EvaluationResultStore:
+    '''Persistent (SQLite-based) store of per-item correctness vectors of evaluations. 
+       Allows to re-score evaluations under new population weights without re-tagging. 
+       The database uses write-ahead logging, so that several evaluation processes can 
+       append to the same store at the same time.
+    '''
+
+    def __init__(self, db_file_name='evaluation_results.db', timeout=60.0):
+        assert isinstance(db_file_name, str)
+        self._db_file_name = db_file_name
+        self._connection = sqlite3.connect(self._db_file_name, timeout=timeout)
+        self._connection.execute("PRAGMA journal_mode=WAL;")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS items (item_id INTEGER PRIMARY KEY, item_key TEXT UNIQUE NOT NULL);")
+            # item_ids: int64 array of item ids; correct: bit-packed correctness vector
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations (eval_id INTEGER PRIMARY KEY AUTOINCREMENT, "+\
+                "eval_name TEXT NOT NULL, benchmark_fingerprint TEXT, created_at TEXT, "+\
+                "item_count INTEGER NOT NULL, item_ids BLOB NOT NULL, correct BLOB NOT NULL);")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS evaluations_name_idx ON evaluations (eval_name);")
+
+    def _get_item_ids(self, item_keys):
+        ''' [Internal] Finds ids of items, adds missing items into the items table. '''
+        self._connection.executemany("INSERT OR IGNORE INTO items (item_key) VALUES (?);", 
+                                     [(key,) for key in item_keys])
+        key_to_id = dict(self._connection.execute("SELECT item_key, item_id FROM items;"))
+        return np.array([key_to_id[key] for key in item_keys], dtype=np.int64)
+
+    def add_evaluation(self, eval_name, item_keys, correct_vector, benchmark_fingerprint=None):
+        '''Adds per-item correctness vector of the evaluation eval_name into the store.'''
+        correct_vector = np.asarray(correct_vector, dtype=bool)
+        if len(item_keys) != len(correct_vector):
+            raise ValueError(f'(!) Number of item_keys ({len(item_keys)}) does not match the '+\
+                             f'length of correct_vector ({len(correct_vector)}).')
+        with self._connection:
+            item_ids = self._get_item_ids(item_keys)
+            self._connection.execute(
+                "INSERT INTO evaluations (eval_name, benchmark_fingerprint, created_at, item_count, "+\
+                "item_ids, correct) VALUES (?, ?, ?, ?, ?, ?);", 
+                (eval_name, benchmark_fingerprint, datetime.now().isoformat(), len(correct_vector), 
+                 item_ids.tobytes(), np.packbits(correct_vector).tobytes()))
+
+    def get_evaluation_names(self):
+        '''Returns distinct names of the stored evaluations.'''
+        return [row[0] for row in 
+                self._connection.execute("SELECT DISTINCT eval_name FROM evaluations ORDER BY eval_name;")]
+
+    def get_benchmark_fingerprints(self, eval_names=None):
+        '''Returns a dictionary mapping names of the stored evaluations (the latest 
+           evaluation of each name) to their benchmark fingerprints (None if unknown).'''
+        rows = self._connection.execute(
+            "SELECT eval_name, benchmark_fingerprint FROM evaluations WHERE eval_id IN "+\
+            "(SELECT MAX(eval_id) FROM evaluations GROUP BY eval_name);").fetchall()
+        if eval_names is not None:
+            rows = [row for row in rows if row[0] in set(eval_names)]
+        return dict(rows)
+
+    def load_correct_matrix(self, item_keys, eval_names=None):
+        '''
+        Loads stored evaluations (the latest evaluation of each name) and aligns their 
+        correctness vectors with the given item_keys. 
+        Returns a tuple (names, correct_matrix, covered), where correct_matrix is a boolean 
+        matrix of shape (len(names), len(item_keys)), and covered is a boolean vector 
+        indicating which evaluations contained all the items.
+        '''
+        rows = self._connection.execute(
+            "SELECT eval_name, item_count, item_ids, correct FROM evaluations WHERE eval_id IN "+\
+            "(SELECT MAX(eval_id) FROM evaluations GROUP BY eval_name) ORDER BY eval_id;").fetchall()
+        if eval_names is not None:
+            rows = [row for row in rows if row[0] in set(eval_names)]
+        key_to_id = dict(self._connection.execute("SELECT item_key, item_id FROM items;"))
+        target_ids = np.array([key_to_id.get(key, -1) for key in item_keys], dtype=np.int64)
+        names = []
+        correct_matrix = np.zeros((len(rows), len(item_keys)), dtype=bool)
+        covered = np.zeros(len(rows), dtype=bool)
+        for i, (eval_name, item_count, item_ids, correct) in enumerate(rows):
+            names.append(eval_name)
+            item_ids = np.frombuffer(item_ids, dtype=np.int64)
+            correct = np.unpackbits(np.frombuffer(correct, dtype=np.uint8), count=item_count).astype(bool)
+            # Align stored items with the target items via binary search
+            order = np.argsort(item_ids, kind='stable')
+            positions = np.searchsorted(item_ids, target_ids, sorter=order)
+            positions = np.minimum(positions, len(item_ids) - 1)
+            found = (item_ids[order[positions]] == target_ids) if len(item_ids) > 0 \
+                    else np.zeros(len(target_ids), dtype=bool)
+            covered[i] = found.all()
+            correct_matrix[i, found] = correct[order[positions[found]]]
+        return names, correct_matrix, covered
+
+    def close(self):
+        self._connection.close()
+
+
+# =================================================================
+#  Exact and bootstrap confidence intervals of the recall estimate
+# =================================================================
+
+RECALL_ESTIMATION_METHODS = ['precise_recall', 'exact_convolution', 'bootstrap']
+
+def _binomial_pmfs(n, probabilities):
+    ''' [Internal] Calculates binomial probability mass functions Binomial(n, p) for each 
+        p in probabilities. Returns an array of shape (len(probabilities), n+1). '''
+    probabilities = np.asarray(probabilities, dtype=float)[:, np.newaxis]
+    k = np.arange(n + 1)
+    # log(n choose k) as a cumulative sum of log((n-i+1)/i)
+    log_binom = np.concatenate(([0.0], np.cumsum(np.log(np.arange(n, 0, -1)) - np.log(np.arange(1, n + 1)))))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_pmfs = log_binom + k * np.log(probabilities) + (n - k) * np.log1p(-probabilities)
+    pmfs = np.exp(log_pmfs)
+    # Degenerate distributions (log(0) yields nan in 0*log(0))
+    pmfs[probabilities[:, 0] == 0.0] = (k == 0)
+    pmfs[probabilities[:, 0] == 1.0] = (k == n)
+    return pmfs
+
+def _distribution_quantiles(pmfs, grid_step, quantiles):
+    ''' [Internal] Finds quantiles of distributions given as pmfs over a grid with step grid_step. 
+        Returns an array of shape (len(quantiles), len(pmfs)). '''
+    cdfs = np.cumsum(pmfs, axis=1)
+    cdfs /= cdfs[:, -1:]
+    return np.stack([ (cdfs < q).sum(axis=1) * grid_step for q in quantiles ])
+
+def convolution_confidence_intervals(correct_counts, item_counts, weights, confidence=0.95, grid_step=1e-4):
+    '''
+    Finds confidence intervals of recall estimates from the exact distribution of the 
+    weighted sum of per-population binomial distributions. 
+    The number of correct items of the population p is modelled as Binomial(n_p, q_p), 
+    where n_p is the number of evaluated items and q_p is the observed proportion of 
+    correct items in the population. The distribution of the recall estimate is the 
+    convolution of the distributions of w_p * Binomial(n_p, q_p), where w_p is the weight 
+    of an item of the population p. 
+    Scaled distributions are discretized on a common grid (with step grid_step) and 
+    convolved via FFT, so that all populations and all taggers are processed in one 
+    vectorized pass. 
+    
+    Based on:
+    https://stats.stackexchange.com/questions/485266/better-confidence-intervals-for-weighted-average
+    https://stackoverflow.com/questions/28901221/faster-convolution-of-probability-density-functions-in-python
+
+    Parameters
+    ----------
+    correct_counts: array_like
+        Numbers of correct items of shape (taggers, populations).
+    item_counts: array_like
+        Numbers of evaluated items in each population.
+    weights: array_like
+        Weight of a single item of each population (see population_weights(...)).
+    confidence: float
+        Confidence level. Default: 0.95.
+    grid_step: float
+        Resolution of the discretization grid. Default: 1e-4.
+
+    Returns
+    -------
+    Tuple[numpy.ndarray, numpy.ndarray]
+        Arrays of lower and upper bounds of confidence intervals, each of length taggers.
+    '''
+    correct_counts = np.atleast_2d(np.asarray(correct_counts))
+    item_counts = np.asarray(item_counts)
+    weights = np.asarray(weights, dtype=float)
+    evaluated = np.flatnonzero(item_counts > 0)
+    # Size of the grid must exceed the maximum value of the sum to avoid circular wrap-around
+    max_value = np.sum(weights[evaluated] * item_counts[evaluated])
+    grid_size = int(np.ceil(max_value / grid_step)) + 1
+    fft_size = 1 << (grid_size - 1).bit_length()
+    spectrum = np.ones((correct_counts.shape[0], fft_size // 2 + 1), dtype=complex)
+    for pop_id in evaluated:
+        n = int(item_counts[pop_id])
+        pmfs = _binomial_pmfs(n, correct_counts[:, pop_id] / n)
+        # Place mass of k correct items onto the grid point nearest to w_p * k
+        grid_pmfs = np.zeros((pmfs.shape[0], fft_size))
+        grid_index = np.rint(weights[pop_id] * np.arange(n + 1) / grid_step).astype(np.intp)
+        np.add.at(grid_pmfs, (slice(None), grid_index), pmfs)
+        spectrum *= np.fft.rfft(grid_pmfs, axis=1)
+    sum_pmfs = np.clip(np.fft.irfft(spectrum, n=fft_size, axis=1)[:, :grid_size], 0.0, None)
+    alpha = 1.0 - confidence
+    lowers, uppers = _distribution_quantiles(sum_pmfs, grid_step, [alpha / 2, 1.0 - alpha / 2])
+    return lowers, uppers
+
+def bootstrap_confidence_intervals(correct_counts, item_counts, weights, confidence=0.95, 
+                                   n_resamples=10000, seed=1):
+    '''
+    Finds confidence intervals of recall estimates via the stratified bootstrap: 
+    items of each population are resampled with replacement (independently from other 
+    populations), and percentiles of the resampled recall estimates are taken as 
+    bounds of confidence intervals. 
+    Resampling n_p items of a population with replacement is equivalent to drawing 
+    the number of correct items from Binomial(n_p, q_p), so all resamples of all 
+    taggers are drawn in one vectorized call. 
+    Parameters and return values are the same as in convolution_confidence_intervals(...), 
+    except n_resamples (the number of bootstrap resamples) and seed (seed of the random 
+    number generator). 
+    '''
+    correct_counts = np.atleast_2d(np.asarray(correct_counts))
+    item_counts = np.asarray(item_counts)
+    weights = np.asarray(weights, dtype=float)
+    rng = np.random.default_rng(seed)
+    proportions = np.divide(correct_counts, item_counts, out=np.zeros(correct_counts.shape), 
+                            where=(item_counts > 0))
+    # Shape: (n_resamples, taggers, populations)
+    resampled_counts = rng.binomial(item_counts, proportions, size=(n_resamples,) + correct_counts.shape)
+    resampled_recalls = resampled_counts @ weights
+    alpha = 1.0 - confidence
+    lowers, uppers = np.quantile(resampled_recalls, [alpha / 2, 1.0 - alpha / 2], axis=0)
+    return lowers, uppers
+
+
 # =================================================================
 #  Detect overlaps between evaluation datasets
 # =================================================================
 
-def detect_evaluation_sets_overlaps(root_dir='.', description_file='data_description.csv', verbose=True):
-    eval_sets = {}
+def _iter_evaluation_set_items(root_dir='.', description_file='data_description.csv'):
+    ''' [Internal] Streams annotated items of all evaluation sets found in root_dir directly 
+        from recall set CSV files (without building estnltk objects). Evaluation sets are 
+        visited in the sorted order of their directories. 
+        Yields tuples (set_name, population, filename, row_index, text, span). '''
+    set_descriptions = {}
     for root, dirs, files in os.walk(root_dir):
         if description_file in files:
-            fpath = os.path.join(root, description_file)
-            eval_sets[root] = load_evaluation_data(description_file=fpath)
-            print(f'Loaded evaluation set {root!r} of size {len(eval_sets[root])}.')
+            set_descriptions[root] = os.path.join(root, description_file)
+    for set_name in sorted( set_descriptions.keys() ):
+        desc = read_csv(set_descriptions[set_name])
+        for filename, population in zip(desc.file, desc.population):
+            data = read_csv(filename)
+            for row_index, (text_str, span) in enumerate(zip(data.text, data.span)):
+                yield set_name, population, filename, row_index, text_str, ast.literal_eval(span)
+
+def _normalize_sentence(text):
+    ''' [Internal] Normalizes sentence for near duplicate detection: lowercases, removes 
+        punctuation and collapses whitespace. '''
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+def _minhash_signatures(texts, num_perm=64, shingle_size=5, seed=1):
+    ''' [Internal] Calculates MinHash signatures of character shingles of the texts. 
+        Returns an uint64 array of shape (len(texts), num_perm). '''
+    prime = (1 << 31) - 1
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, prime, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, prime, size=num_perm, dtype=np.uint64)
+    signatures = np.zeros((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        shingles = {text[j:j+shingle_size] for j in range(max(1, len(text)-shingle_size+1))}
+        hashes = np.array([zlib.crc32(sh.encode('utf-8')) % prime for sh in shingles], dtype=np.uint64)
+        # Universal hashing (a*x + b) mod prime; all values are below 2**31, so no overflow
+        signatures[i] = ((np.outer(hashes, a) + b) % np.uint64(prime)).min(axis=0)
+    return signatures
+
+def find_evaluation_sets_overlaps(root_dir='.', description_file='data_description.csv', near_duplicates=True, 
+                                  similarity_threshold=0.8, num_perm=64, bands=16):
+    '''
+    Detects overlaps between evaluation sets found in root_dir (directories containing 
+    description_file). Works directly on recall set CSV files, without building estnltk 
+    objects, so it scales to many benchmark directories. 
+    Detects:
+    * 'duplicate_annotation' -- the same sentence annotated at the same location with 
+      the same labels in multiple places; 
+    * 'label_conflict' -- the same sentence annotated at the same location with different 
+      labels; 
+    * 'near_duplicate_sentence' -- (if near_duplicates=True) different sentences that are 
+      (nearly) equal after normalization (e.g. differ only by whitespace or punctuation). 
+      Candidates are found via MinHash/LSH (num_perm hash functions split into bands) and 
+      confirmed if the estimated Jaccard similarity of their character shingles is at least 
+      similarity_threshold. 
+    Exact duplicates are detected via hashed (sentence, start, end) keys. 
+    Returns the overlap report as a DataFrame with one row per detected overlap.
+    '''
+    if num_perm % bands != 0:
+        raise ValueError(f'(!) num_perm ({num_perm}) must be divisible by bands ({bands}).')
+    report = []
+    seen_annotations = defaultdict(list)
+    first_sentence_occurrence = {}
+    for set_name, population, filename, row_index, text_str, span in \
+            _iter_evaluation_set_items(root_dir=root_dir, description_file=description_file):
+        item = (set_name, population, filename, row_index)
+        location_key = hashlib.sha1(f'{text_str}\t{span["start"]}\t{span["end"]}'.encode('utf-8')).digest()
+        for prev_item, prev_labels in seen_annotations[location_key]:
+            report.append({'overlap': 'duplicate_annotation' if prev_labels == span['labels'] else 'label_conflict', 
+                           'set': prev_item[0], 'population': prev_item[1], 'file': prev_item[2], 'row': prev_item[3], 
+                           'other_set': set_name, 'other_population': population, 'other_file': filename, 
+                           'other_row': row_index, 'sentence': text_str, 'other_sentence': text_str, 
+                           'start': span['start'], 'end': span['end'], 'labels': prev_labels, 
+                           'other_labels': span['labels'], 'similarity': 1.0})
+        seen_annotations[location_key].append( (item, span['labels']) )
+        if text_str not in first_sentence_occurrence:
+            first_sentence_occurrence[text_str] = item
+    if near_duplicates and first_sentence_occurrence:
+        sentences = list(first_sentence_occurrence.keys())
+        normalized = [_normalize_sentence(sentence) for sentence in sentences]
+        signatures = _minhash_signatures(normalized, num_perm=num_perm)
+        rows_per_band = num_perm // bands
+        candidates = set()
+        for band in range(bands):
+            buckets = defaultdict(list)
+            band_signatures = signatures[:, band*rows_per_band:(band+1)*rows_per_band]
+            for i, band_signature in enumerate(band_signatures):
+                buckets[band_signature.tobytes()].append(i)
+            for bucket in buckets.values():
+                for j in range(1, len(bucket)):
+                    for i in bucket[:j]:
+                        candidates.add( (i, bucket[j]) )
+        for i, j in sorted(candidates):
+            similarity = float(np.mean(signatures[i] == signatures[j]))
+            if normalized[i] == normalized[j]:
+                similarity = 1.0
+            if similarity >= similarity_threshold:
+                item, other_item = first_sentence_occurrence[sentences[i]], first_sentence_occurrence[sentences[j]]
+                report.append({'overlap': 'near_duplicate_sentence', 
+                               'set': item[0], 'population': item[1], 'file': item[2], 'row': item[3], 
+                               'other_set': other_item[0], 'other_population': other_item[1], 
+                               'other_file': other_item[2], 'other_row': other_item[3], 
+                               'sentence': sentences[i], 'other_sentence': sentences[j], 
+                               'start': None, 'end': None, 'labels': None, 'other_labels': None, 
+                               'similarity': similarity})
+    columns = ['overlap', 'set', 'population', 'file', 'row', 'other_set', 'other_population', 'other_file', 
+               'other_row', 'sentence', 'other_sentence', 'start', 'end', 'labels', 'other_labels', 'similarity']
+    return pd.DataFrame(report, columns=columns)
+
+def detect_evaluation_sets_overlaps(root_dir='.', description_file='data_description.csv', verbose=True):
+    '''
+    Detects duplicate annotations (annotations of the same sentence at the same location) 
+    between evaluation sets found in root_dir. Returns a dictionary mapping duplicate 
+    sentences to their duplicate annotations. 
+    Streams items directly from recall set CSV files and indexes annotations by hashed 
+    (sentence, start, end) keys. See find_evaluation_sets_overlaps(...) for a structured 
+    report which also includes near duplicate sentences.
+    '''
     all_texts = 0
     all_text_annotations = 0
     duplicate_texts = 0
     duplicate_text_annotations = 0
     seen_texts = set()
-    seen_text_annotations = dict()
+    seen_text_annotations = defaultdict(list)
     confirmed_duplicates = dict()
-    for set_name in sorted( eval_sets.keys() ):
-        for sent_text_obj, population in zip(eval_sets[set_name].text, eval_sets[set_name].population):
-            all_texts += 1
-            sent_str = sent_text_obj.text
-            if sent_str not in seen_texts:
-                seen_texts.add(sent_str)
-                seen_text_annotations[sent_str] = []
-                for span in sent_text_obj['_gold_ner']:
-                    all_text_annotations += 1
-                    annotation = (span.start, span.end, span.text, span.annotations[0]['labels'], population, set_name)
-                    seen_text_annotations[sent_str].append( annotation )
-            else:
-                duplicate_texts += 1
-                for span in sent_text_obj['_gold_ner']:
-                    all_text_annotations += 1
-                    annotation = (span.start, span.end, span.text, span.annotations[0]['labels'], population, set_name)
-                    # Check for the annotation duplicate
-                    for prev_annotation in seen_text_annotations[sent_str]:
-                        if annotation[:-3] == prev_annotation[:-3]:
-                            if sent_str not in confirmed_duplicates:
-                                confirmed_duplicates[sent_str] = {}
-                            ann_key = str(annotation[:-3])
-                            if ann_key not in confirmed_duplicates[sent_str]:
-                                confirmed_duplicates[sent_str][ann_key] = [prev_annotation]
-                            confirmed_duplicates[sent_str][ann_key].append(annotation)
-                            duplicate_text_annotations += 1
-                    seen_text_annotations[sent_str].append( annotation )
+    for set_name, population, filename, row_index, sent_str, span in \
+            _iter_evaluation_set_items(root_dir=root_dir, description_file=description_file):
+        all_texts += 1
+        all_text_annotations += 1
+        if sent_str not in seen_texts:
+            seen_texts.add(sent_str)
+        else:
+            duplicate_texts += 1
+        annotation = (span['start'], span['end'], span['text'], span['labels'], population, set_name)
+        location_key = hashlib.sha1(f'{sent_str}\t{span["start"]}\t{span["end"]}'.encode('utf-8')).digest()
+        prev_annotations = seen_text_annotations[location_key]
+        if prev_annotations:
+            if sent_str not in confirmed_duplicates:
+                confirmed_duplicates[sent_str] = {}
+            ann_key = str(annotation[:-3])
+            if ann_key not in confirmed_duplicates[sent_str]:
+                confirmed_duplicates[sent_str][ann_key] = [prev_annotations[0]]
+            confirmed_duplicates[sent_str][ann_key].append(annotation)
+            duplicate_text_annotations += len(prev_annotations)
+        prev_annotations.append( annotation )
     if verbose:
         print()
         for sent_str in confirmed_duplicates.keys():
@@ -341,26 +1178,347 @@ def detect_evaluation_sets_overlaps(root_dir='.', description_file='data_descrip
     return confirmed_duplicates
 
 
+# =================================================================
+#  Profiling of the evaluation
+# =================================================================
+
+# Columns of the profiling summary (see EvaluationProfiler.summary())
+PROFILING_COLUMNS = ['sentences/s', 'tagger_p50_ms', 'tagger_p95_ms', 'tagger_p99_ms', 'peak_rss_MB']
+
+class EvaluationProfiler:
+    '''Collects wall-clock and CPU times of evaluation stages ('prerequisites', 'pop_layers', 
+       'tagger', 'scoring') and per-sentence latencies of the tagger.
+    '''
+
+    def __init__(self):
+        self.wall_times = defaultdict(float)
+        self.cpu_times = defaultdict(float)
+        self.tagger_latencies = []
+        self.sentences = 0
+        self.total_wall_time = 0.0
+        self._start_time = None
+        self._start_taggings = 0
+
+    @contextmanager
+    def stage(self, name):
+        '''Context manager that measures time of the evaluation stage name.'''
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            self.wall_times[name] += wall_time
+            self.cpu_times[name] += time.process_time() - cpu_start
+            if name == 'tagger':
+                self.tagger_latencies.append(wall_time)
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        self._start_taggings = len(self.tagger_latencies)
+
+    def stop(self, sentences=None):
+        '''Stops the measurement of the total wall-clock time. If sentences is None, then 
+           counts sentences that were run through the tagger (see stage('tagger')) after 
+           start(). Note that deduplicated or cached evaluations tag fewer sentences than 
+           there are benchmark rows.'''
+        self.total_wall_time += time.perf_counter() - self._start_time
+        if sentences is None:
+            sentences = len(self.tagger_latencies) - self._start_taggings
+        self.sentences += sentences
+        self._start_time = None
+
+    def merge(self, other):
+        '''Adds stage timings and tagger latencies of the other profiler to this profiler.'''
+        if other is None:
+            return
+        for name, wall_time in other.wall_times.items():
+            self.wall_times[name] += wall_time
+        for name, cpu_time in other.cpu_times.items():
+            self.cpu_times[name] += cpu_time
+        self.tagger_latencies.extend(other.tagger_latencies)
+
+    def summary(self):
+        '''Returns a dictionary with throughput (sentences per second), percentiles of 
+           tagger latencies (in milliseconds) and peak RSS of the process (in MB).'''
+        if self.tagger_latencies:
+            p50, p95, p99 = np.percentile(np.array(self.tagger_latencies) * 1000.0, [50, 95, 99])
+        else:
+            p50, p95, p99 = np.nan, np.nan, np.nan
+        throughput = self.sentences / self.total_wall_time if self.total_wall_time > 0 else np.nan
+        return {'sentences/s': float(throughput), 
+                'tagger_p50_ms': float(p50), 'tagger_p95_ms': float(p95), 'tagger_p99_ms': float(p99), 
+                'peak_rss_MB': peak_rss_mb()}
+
+    def report(self):
+        '''Returns a DataFrame with wall-clock and CPU times (in seconds) of each stage.'''
+        stages = list(self.wall_times.keys())
+        return pd.DataFrame({'wall_time': [self.wall_times[name] for name in stages], 
+                             'cpu_time': [self.cpu_times[name] for name in stages]}, 
+                            index=pd.Index(stages, name='stage'))
+
+
+def _profile_stage(profiler, name):
+    ''' [Internal] Returns context manager measuring the stage, or a no-op if profiler is None. '''
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+def peak_rss_mb():
+    '''Returns peak resident set size (in MB) of the current process and its child processes. 
+       Returns None if the information is not available on this platform.'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS, and in kilobytes on Linux
+    return peak_rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak_rss / 1024.0
+
+
+# =================================================================
+#  Tagger output cache
+# =================================================================
+
+# Memo of model path hashes: (path, file stats) -> sha256 hex digest
+_model_path_hashes = {}
+
+def _model_path_sha256(path):
+    ''' [Internal] Calculates sha256 hex digest of a model file or directory (all files 
+        in the directory tree, in sorted order). Hashes are memoized by the path and by 
+        (relative path, size, modification time) of every file under the path, so 
+        unchanged models are hashed only once per process. '''
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        file_paths = []
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            file_paths.extend(os.path.join(dir_path, file_name) for file_name in sorted(file_names))
+    else:
+        file_paths = [path]
+    file_stats = []
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        file_stats.append( (os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns) )
+    memo_key = (path, tuple(file_stats))
+    if memo_key not in _model_path_hashes:
+        if os.path.isdir(path):
+            path_hash = hashlib.sha256()
+            for file_path, (rel_path, _, _) in zip(file_paths, file_stats):
+                path_hash.update(f'{rel_path}\n'.encode('utf-8'))
+                path_hash.update(bytes.fromhex(_model_path_sha256(file_path)))
+            _model_path_hashes[memo_key] = path_hash.hexdigest()
+        else:
+            _model_path_hashes[memo_key] = _file_sha256(path)
+    return _model_path_hashes[memo_key]
+
+def tagger_fingerprint(tagger, model_files=None):
+    '''
+    Calculates fingerprint (sha256 hex digest) of the tagger. The fingerprint covers 
+    the class of the tagger, its output/input layers and configuration parameters, 
+    contents of model files/directories listed in model_files, and the version of estnltk. 
+    Each entry of model_files is either a path, or a name of tagger's configuration 
+    parameter which holds the path (e.g. 'model_location'). Paths are never guessed 
+    from parameter values, so model files of the tagger must be listed explicitly. 
+    Parameters that cannot be represented deterministically (e.g. other objects) are 
+    only represented by their type, so if the tagger depends on such an object, then 
+    pass its model files via model_files.
+    '''
+    fingerprint = hashlib.sha256()
+    fingerprint.update(f'estnltk=={estnltk.__version__}\n'.encode('utf-8'))
+    fingerprint.update(f'{type(tagger).__module__}.{type(tagger).__qualname__}\n'.encode('utf-8'))
+    output_layers = tagger.output_layers if isinstance(tagger, MultiLayerTagger) else [tagger.output_layer]
+    fingerprint.update(f'output_layers={list(output_layers)!r}\n'.encode('utf-8'))
+    fingerprint.update(f'input_layers={list(tagger.input_layers)!r}\n'.encode('utf-8'))
+    conf_params = sorted(getattr(tagger, 'conf_param', ()))
+    for param in conf_params:
+        value = getattr(tagger, param, None)
+        if isinstance(value, (str, int, float, bool, type(None))) or \
+           (isinstance(value, (tuple, list)) and all(isinstance(v, (str, int, float, bool)) for v in value)):
+            fingerprint.update(f'{param}={value!r}\n'.encode('utf-8'))
+        else:
+            fingerprint.update(f'{param}:{type(value).__qualname__}\n'.encode('utf-8'))
+    for entry in (model_files if model_files is not None else []):
+        path = getattr(tagger, entry) if entry in conf_params else entry
+        if not isinstance(path, (str, os.PathLike)) or not os.path.exists(path):
+            raise ValueError(f'(!) Model file {entry!r} of the tagger does not exist: {path!r}')
+        fingerprint.update(f'model:{_model_path_sha256(path)}\n'.encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+class TaggerOutputCache:
+    '''Content-addressed on-disk (SQLite-based) cache of tagger outputs. 
+       Entries are keyed by the tagger_fingerprint(...), the name of the evaluated output 
+       layer and the sentence_hash(...) of the text, and hold output layer spans as (start, end, nertag) tuples. As keys do not 
+       depend on the benchmark, the cache can be shared across benchmarks. 
+       The total size of entries is bounded by max_size_mb: if the limit is exceeded, 
+       the least recently used entries are evicted.
+    '''
+
+    def __init__(self, cache_dir='.tagger_cache', max_size_mb=512, timeout=60.0):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self._db_file_name = os.path.join(cache_dir, 'tagger_outputs.db')
+        self._connection = sqlite3.connect(self._db_file_name, timeout=timeout)
+        self._connection.execute("PRAGMA journal_mode=WAL;")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS outputs (key TEXT PRIMARY KEY, spans TEXT NOT NULL, "+\
+                "size INTEGER NOT NULL, last_access REAL NOT NULL);")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS outputs_access_idx ON outputs (last_access);")
+
+    @staticmethod
+    def entry_key(fingerprint, auto_layer, sentence_hash):
+        return f'{fingerprint}:{auto_layer}:{sentence_hash}'
+
+    def get_many(self, keys, batch_size=500):
+        '''Looks up entries of the keys. Returns a dictionary mapping found keys to lists of 
+           (start, end, nertag) tuples. Marks found entries as recently used.'''
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i+batch_size]
+            placeholders = ','.join('?' * len(batch))
+            for key, spans in self._connection.execute(
+                    f"SELECT key, spans FROM outputs WHERE key IN ({placeholders});", batch):
+                found[key] = [tuple(span) for span in json.loads(spans)]
+        if found:
+            with self._connection:
+                self._connection.executemany("UPDATE outputs SET last_access = ? WHERE key = ?;", 
+                                             [(time.time(), key) for key in found])
+        return found
+
+    def put_many(self, entries):
+        '''Adds entries (a dictionary mapping keys to lists of (start, end, nertag) tuples) 
+           into the cache, and evicts the least recently used entries if the cache exceeds 
+           its size limit.'''
+        rows = []
+        for key, spans in entries.items():
+            spans_json = json.dumps([list(span) for span in spans], ensure_ascii=False)
+            rows.append( (key, spans_json, len(key) + len(spans_json.encode('utf-8')), time.time()) )
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO outputs (key, spans, size, last_access) VALUES (?, ?, ?, ?);", rows)
+            self._evict()
+
+    def _evict(self):
+        ''' [Internal] Deletes the least recently used entries until the total size of 
+            the cache fits into max_size_bytes. '''
+        total_size = self.size_bytes()
+        if total_size <= self.max_size_bytes:
+            return
+        to_delete = []
+        for key, size in self._connection.execute("SELECT key, size FROM outputs ORDER BY last_access;"):
+            if total_size <= self.max_size_bytes:
+                break
+            to_delete.append( (key,) )
+            total_size -= size
+        self._connection.executemany("DELETE FROM outputs WHERE key = ?;", to_delete)
+
+    def size_bytes(self):
+        '''Returns the total size of cached entries (in bytes).'''
+        return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM outputs;").fetchone()[0]
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM outputs;").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
 # =================================================================
 #  Load evaluation data, perform evaluation and estimate recall    
 # =================================================================
 
-def load_evaluation_data(description_file='data_description.csv', validate=True):
+def load_evaluation_data(description_file='data_description.csv', validate=True, validation_cache=None):
     if validate:
-        validate_evaluation_data(description_file=description_file)
-    gold_standard = pd.DataFrame(columns=('text','population'))
+        validate_evaluation_data(description_file=description_file, cache_file=validation_cache)
+    texts = []
+    populations = []
+    for population, text_obj in iter_evaluation_data(description_file=description_file):
+        texts.append(text_obj)
+        populations.append(population)
+    return pd.DataFrame({'text': texts, 'population': populations}, columns=('text','population'))
+
+def _iter_recall_set_rows(description_file='data_description.csv', chunksize=1000):
+    ''' [Internal] Lazily reads rows of recall set files listed in the description_file 
+        (in chunks of chunksize rows). Yields tuples (population, text, span). '''
     desc = read_csv(description_file)
     for filename, population, positive in zip(desc.file, desc.population, desc.positive):
-        data = read_csv(filename)
-        assert len(data.text) == positive
-        for text_str, span in zip(data.text, data.span):
-            text_obj = Text(text_str)
-            span = ast.literal_eval( span )
-            assert isinstance(span['labels'], list)
-            gold_layer = Layer('_gold_ner', attributes=['labels'], text_object=text_obj)
-            gold_layer.add_annotation( (span['start'], span['end']), labels=span['labels'] )
-            text_obj.add_layer( gold_layer )
-            gold_standard.loc[len(gold_standard)] = {'text':text_obj, 'population':population}
+        rows_count = 0
+        for chunk in read_csv(filename, chunksize=chunksize):
+            for text_str, span in zip(chunk.text, chunk.span):
+                span = ast.literal_eval( span )
+                assert isinstance(span['labels'], list)
+                rows_count += 1
+                yield population, text_str, span
+        assert rows_count == positive
+
+def _create_gold_text(text_str, span, gold_layer='_gold_ner'):
+    ''' [Internal] Creates Text object with the gold annotation layer. '''
+    text_obj = Text(text_str)
+    layer = Layer(gold_layer, attributes=['labels'], text_object=text_obj)
+    layer.add_annotation( (span['start'], span['end']), labels=span['labels'] )
+    text_obj.add_layer( layer )
+    return text_obj
+
+def iter_evaluation_data(description_file='data_description.csv', gold_layer='_gold_ner'):
+    '''Lazily loads evaluation data: reads recall set files listed in the description_file 
+       in chunks, and yields tuples (population, Text) one at a time. 
+       Unlike load_evaluation_data(...), does not validate the data and does not keep 
+       Text objects in memory.
+    '''
+    for population, text_str, span in _iter_recall_set_rows(description_file=description_file):
+        yield population, _create_gold_text(text_str, span, gold_layer=gold_layer)
+
+def benchmark_fingerprint(description_file='data_description.csv', include_description=True):
+    '''Calculates fingerprint (sha256 hex digest) of the evaluation benchmark. 
+       The fingerprint covers contents of the description_file, contents of all 
+       recall set files listed in the description_file, and the version of estnltk.
+       If include_description is False, then contents of the description_file (e.g. 
+       occurrence counts of populations) are left out, and only names of the recall 
+       set files are taken from it. 
+    '''
+    fingerprint = hashlib.sha256()
+    fingerprint.update(f'estnltk=={estnltk.__version__}\n'.encode('utf-8'))
+    if include_description:
+        with open(description_file, 'rb') as in_f:
+            fingerprint.update(hashlib.sha256(in_f.read()).digest())
+    desc = read_csv(description_file)
+    for filename in desc.file:
+        fingerprint.update(f'{filename}\n'.encode('utf-8'))
+        if os.path.isfile(filename):
+            with open(filename, 'rb') as in_f:
+                fingerprint.update(hashlib.sha256(in_f.read()).digest())
+    return fingerprint.hexdigest()
+
+def load_evaluation_data_cached(description_file='data_description.csv', cache_dir='.benchmark_cache'):
+    '''Loads evaluation data from the on-disk cache in cache_dir. 
+       The cache is content-addressed: its key is the benchmark_fingerprint(...) of 
+       the description_file. On cache miss, loads and validates evaluation data, 
+       adds prerequisite layers (via tag_layer()) to all gold texts, and saves the 
+       results into the cache. On cache hit, validation is skipped, because the 
+       benchmark files have not changed since the cached data was validated.
+    '''
+    fingerprint = benchmark_fingerprint(description_file=description_file)
+    cache_file = os.path.join(cache_dir, f'gold_standard_{fingerprint}.pickle')
+    if os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as in_f:
+                return pickle.load(in_f)
+        except Exception as unpickling_err:
+            warnings.warn(f'(!) Unable to load cached benchmark {cache_file!r}: {unpickling_err}. '+\
+                           'Reloading benchmark from the source files.')
+    gold_standard = load_evaluation_data(description_file=description_file, validate=True, 
+                                         validation_cache=os.path.join(cache_dir, 'validation_cache.json'))
+    for text_obj in gold_standard.text:
+        # Add prerequisite layers
+        text_obj.tag_layer()
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write into a temporary file first, so that concurrent processes never see a partial cache
+    tmp_cache_file = f'{cache_file}.{os.getpid()}.tmp'
+    with open(tmp_cache_file, 'wb') as out_f:
+        pickle.dump(gold_standard, out_f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_cache_file, cache_file)
     return gold_standard
 
 def _create_empty_layers(tagger):
@@ -373,29 +1531,27 @@ def _create_empty_layers(tagger):
             empty_layers.append(Layer(output_layer, attributes=attribs))
         return empty_layers
 
-def evaluate_benchmark(benchmark_data, tagger, auto_layer=None, 
-                       gold_layer='_gold_ner', method='precise_recall', 
-                       overwrite_existing=True, ignore_errors=False):
-    if auto_layer is None:
-        # Try to detect name of the ner layer automatically
-        if isinstance(tagger, Tagger):
-            auto_layer = tagger.output_layer
-        elif isinstance(tagger, MultiLayerTagger):
-            auto_layer = tagger.output_layers[0]
-        else:
-            raise TypeError(f'(!) Unexpected tagger type {type(tagger)!r}, '+\
-                             'unable to detect name of the output layer.')
-    columns=['correct']
-    for population in set(benchmark_data.population.values):
-        columns.append(f'{population}_correct')
-    results = pd.DataFrame(columns = ['correct', 'population'])
-    for eval_sentence, cur_population in tqdm( zip(benchmark_data.text, benchmark_data.population), \
-                                               total=len(benchmark_data.text) ):
+def _detect_output_layer(tagger):
+    ''' [Internal] Detects name of the (first) output layer of the tagger. '''
+    if isinstance(tagger, Tagger):
+        return tagger.output_layer
+    elif isinstance(tagger, MultiLayerTagger):
+        return tagger.output_layers[0]
+    else:
+        raise TypeError(f'(!) Unexpected tagger type {type(tagger)!r}, '+\
+                         'unable to detect name of the output layer.')
+
+def _tag_sentence(eval_sentence, tagger, auto_layer, overwrite_existing=True, ignore_errors=False, 
+                  add_prerequisites=True, profiler=None):
+    ''' [Internal] Tags eval_sentence with the tagger. Returns the output layer auto_layer. '''
+    if add_prerequisites:
         # Add prerequisite layers
-        eval_sentence.tag_layer()
-        
-        # Remove existing layer(s) (if required)
-        if overwrite_existing:
+        with _profile_stage(profiler, 'prerequisites'):
+            eval_sentence.tag_layer()
+    
+    # Remove existing layer(s) (if required)
+    if overwrite_existing:
+        with _profile_stage(profiler, 'pop_layers'):
             if isinstance(tagger, Tagger):
                 if tagger.output_layer in eval_sentence.layers:
                     eval_sentence.pop_layer(tagger.output_layer)
@@ -403,38 +1559,477 @@ def evaluate_benchmark(benchmark_data, tagger, auto_layer=None,
                 for output_layer in tagger.output_layers:
                     if output_layer in eval_sentence.layers:
                         eval_sentence.pop_layer(output_layer)
-        # Add new layer
-        try:
+    # Add new layer
+    try:
+        with _profile_stage(profiler, 'tagger'):
             tagger.tag(eval_sentence)
-        except Exception as ex:
-            if ignore_errors:
-                warnings.warn(f'(!) Failed processing {eval_sentence.text!r} due to an error:\n {ex}')
-                # Create empty output layers
-                # (like tagger detected nothing)
-                empty_layers = _create_empty_layers(tagger)
-                for empty_layer in empty_layers:
-                    eval_sentence.add_layer(empty_layer)
-            else:
-                # Halt the evaluation, raise the exception
-                raise ex
-        
-        if auto_layer not in eval_sentence.layers:
-            raise ValueError(f' (!) Tagger {tagger} did not create layer '+\
-                             f'{auto_layer!r}. Unable to evaluate output.')
-        correct = 'no'
-        nerspans = getattr(eval_sentence, auto_layer)
+    except Exception as ex:
+        if ignore_errors:
+            warnings.warn(f'(!) Failed processing {eval_sentence.text!r} due to an error:\n {ex}')
+            # Create empty output layers
+            # (like tagger detected nothing)
+            empty_layers = _create_empty_layers(tagger)
+            for empty_layer in empty_layers:
+                eval_sentence.add_layer(empty_layer)
+        else:
+            # Halt the evaluation, raise the exception
+            raise ex
+    
+    if auto_layer not in eval_sentence.layers:
+        raise ValueError(f' (!) Tagger {tagger} did not create layer '+\
+                         f'{auto_layer!r}. Unable to evaluate output.')
+    return getattr(eval_sentence, auto_layer)
+
+def _evaluate_sentence(eval_sentence, tagger, auto_layer, gold_layer='_gold_ner', 
+                       overwrite_existing=True, ignore_errors=False, add_prerequisites=True, 
+                       profiler=None):
+    ''' [Internal] Tags eval_sentence with the tagger and checks if the gold span was found. 
+        Returns True if the tagger found the gold span, and False otherwise. '''
+    nerspans = _tag_sentence(eval_sentence, tagger, auto_layer, overwrite_existing=overwrite_existing, 
+                             ignore_errors=ignore_errors, add_prerequisites=add_prerequisites, 
+                             profiler=profiler)
+    with _profile_stage(profiler, 'scoring'):
         gold_span = eval_sentence[gold_layer][0]
         for nerspan in nerspans:
             if nerspan.start==gold_span.start and \
                nerspan.end==gold_span.end and \
                nerspan.nertag==gold_span.labels[0]:
-                correct = 'yes'
-        results.loc[len(results)] = {'population': cur_population, \
-                                     'correct':correct}
-    return results
+                return True
+        return False
+
+def _match_spans_exact(gold_spans, predicted_spans):
+    ''' [Internal] Checks which gold spans were found exactly (same start, end and label) 
+        among the predicted spans. Spans are (start, end, label) tuples, where label can 
+        be None. Predicted spans are put into a set, so each gold span is looked up in O(1). 
+        Returns a list of booleans aligned with gold_spans. '''
+    exact_spans = set(predicted_spans)
+    return [span in exact_spans for span in gold_spans]
+
+# Span matching modes (from the strictest to the most lenient):
+#  'exact'    -- a predicted span has the same start, end and label as the gold span;
+#  'boundary' -- a predicted span has the same start and end (any label);
+#  'partial'  -- a predicted span with the same label overlaps the gold span;
+#  'overlap'  -- a predicted span overlaps the gold span (any label);
+#  'type'     -- a predicted span with the same label occurs in the sentence (any position);
+MATCHING_MODES = ['exact', 'boundary', 'partial', 'overlap', 'type']
+
+class _IntervalIndex:
+    ''' [Internal] Sorted interval index for overlap queries: intervals are sorted by start, 
+        and prefix maxima of ends are kept. An interval overlapping [start, end) exists iff 
+        among intervals starting before end, the maximum end exceeds start. 
+        Construction takes O(n log n), and each query takes O(log n). '''
+    def __init__(self, intervals):
+        intervals = sorted(intervals)
+        self.starts = np.array([start for start, end in intervals], dtype=np.int64)
+        self.max_ends = np.maximum.accumulate(np.array([end for start, end in intervals], dtype=np.int64)) \
+                        if intervals else np.zeros(0, dtype=np.int64)
+
+    def overlaps(self, starts, ends):
+        '''Returns a boolean vector indicating which intervals [starts[i], ends[i]) overlap 
+           with some interval of the index.'''
+        k = np.searchsorted(self.starts, ends, side='left')
+        found = np.zeros(len(k), dtype=bool)
+        has_prev = k > 0
+        found[has_prev] = self.max_ends[k[has_prev] - 1] > starts[has_prev]
+        return found
+
+def _match_spans_all_modes(gold_spans, predicted_spans):
+    ''' [Internal] Matches gold spans against predicted spans in all MATCHING_MODES in one 
+        pass. Spans are (start, end, label) tuples. Overlaps are found with an interval sweep 
+        (sorting + binary search), so matching takes O(n log n) per sentence. 
+        Returns a boolean matrix of shape (len(MATCHING_MODES), len(gold_spans)). '''
+    matches = np.zeros((len(MATCHING_MODES), len(gold_spans)), dtype=bool)
+    if len(gold_spans) == 0 or len(predicted_spans) == 0:
+        return matches
+    gold_starts = np.array([start for start, end, label in gold_spans], dtype=np.int64)
+    gold_ends = np.array([end for start, end, label in gold_spans], dtype=np.int64)
+    gold_labels = [label for start, end, label in gold_spans]
+    exact_spans = set(predicted_spans)
+    boundaries = {(start, end) for start, end, label in predicted_spans}
+    label_intervals = defaultdict(list)
+    for start, end, label in predicted_spans:
+        label_intervals[label].append( (start, end) )
+    matches[0] = [span in exact_spans for span in gold_spans]
+    matches[1] = [(start, end) in boundaries for start, end, label in gold_spans]
+    for label, intervals in label_intervals.items():
+        label_rows = np.array([gold_label == label for gold_label in gold_labels], dtype=bool)
+        if label_rows.any():
+            matches[2, label_rows] = _IntervalIndex(intervals).overlaps(gold_starts[label_rows], 
+                                                                        gold_ends[label_rows])
+            matches[4, label_rows] = True
+    matches[3] = _IntervalIndex([(start, end) for start, end, label in predicted_spans]).overlaps(gold_starts, 
+                                                                                                  gold_ends)
+    return matches
+
+def evaluate_benchmark_all_modes(benchmark_data, tagger, auto_layer=None, gold_layer='_gold_ner', 
+                                 overwrite_existing=True, ignore_errors=False, output_cache=None, 
+                                 model_files=None, profiler=None):
+    '''
+    Evaluates tagger on the benchmark_data in all span MATCHING_MODES in one pass: each 
+    unique sentence is tagged only once (or its output is taken from the output_cache), 
+    and all gold spans of the sentence are matched against the tagger's output in all 
+    modes. Returns boolean correctness matrix of shape (len(MATCHING_MODES), len(benchmark_data)), 
+    aligned with the rows of benchmark_data.
+    '''
+    if auto_layer is None:
+        auto_layer = _detect_output_layer(tagger)
+    texts = list(benchmark_data.text)
+    if profiler is not None:
+        profiler.start()
+    correct = np.zeros((len(MATCHING_MODES), len(texts)), dtype=bool)
+    for rows, predicted_spans in _iter_sentence_predictions(texts, tagger, auto_layer, overwrite_existing, 
+                                                            ignore_errors, output_cache=output_cache, 
+                                                            model_files=model_files, profiler=profiler):
+        with _profile_stage(profiler, 'scoring'):
+            gold_spans = _gold_spans_of_rows(texts, rows, gold_layer)
+            correct[:, rows] = _match_spans_all_modes(gold_spans, predicted_spans)
+    if profiler is not None:
+        profiler.stop()
+    return correct
+
+def _gold_spans_of_rows(texts, rows, gold_layer):
+    ''' [Internal] Returns gold spans of the texts[rows] as (start, end, label) tuples. '''
+    gold_spans = []
+    for i in rows:
+        gold_span = texts[i][gold_layer][0]
+        gold_spans.append( (gold_span.start, gold_span.end, gold_span.labels[0]) )
+    return gold_spans
+
+def _iter_sentence_predictions(texts, tagger, auto_layer, overwrite_existing, ignore_errors, 
+                               output_cache=None, model_files=None, profiler=None, 
+                               cache_batch_size=100):
+    ''' [Internal] Groups texts by the sentence string and tags each unique sentence only once 
+        (the Text object of the first row of the sentence). Yields tuples (rows, predicted_spans), 
+        where predicted_spans are (start, end, nertag) tuples. 
+        If output_cache is provided, then outputs of sentences found in the cache are not 
+        re-tagged, and outputs of the remaining sentences are added to the cache in batches of 
+        cache_batch_size sentences (so that an interrupted evaluation can be resumed from the 
+        cache). Outputs of failed taggings (ignore_errors=True) are not cached. '''
+    sentence_rows = defaultdict(list)
+    for i, text_obj in enumerate(texts):
+        sentence_rows[text_obj.text].append(i)
+    keys = {}
+    cached = {}
+    if output_cache is not None:
+        fingerprint = tagger_fingerprint(tagger, model_files=model_files)
+        keys = {text_str: TaggerOutputCache.entry_key(fingerprint, auto_layer, sentence_hash(text_str)) \
+                for text_str in sentence_rows.keys()}
+        with _profile_stage(profiler, 'cache_lookup'):
+            cached = output_cache.get_many(keys.values())
+    new_entries = {}
+    def flush_new_entries():
+        if new_entries:
+            with _profile_stage(profiler, 'cache_update'):
+                output_cache.put_many(new_entries)
+            new_entries.clear()
+    try:
+        for text_str, rows in tqdm(sentence_rows.items(), total=len(sentence_rows)):
+            if output_cache is None:
+                nerspans = _tag_sentence(texts[rows[0]], tagger, auto_layer, 
+                                         overwrite_existing=overwrite_existing, 
+                                         ignore_errors=ignore_errors, profiler=profiler)
+                predicted_spans = [(span.start, span.end, span.nertag) for span in nerspans]
+            elif keys[text_str] in cached:
+                predicted_spans = cached[keys[text_str]]
+            else:
+                try:
+                    nerspans = _tag_sentence(texts[rows[0]], tagger, auto_layer, 
+                                             overwrite_existing=overwrite_existing, 
+                                             ignore_errors=False, profiler=profiler)
+                    predicted_spans = [(span.start, span.end, span.nertag) for span in nerspans]
+                    new_entries[keys[text_str]] = predicted_spans
+                    if len(new_entries) >= cache_batch_size:
+                        flush_new_entries()
+                except Exception as ex:
+                    if not ignore_errors:
+                        raise ex
+                    warnings.warn(f'(!) Failed processing {text_str!r} due to an error:\n {ex}')
+                    predicted_spans = []
+            yield rows, predicted_spans
+    finally:
+        # Keep outputs of the sentences tagged so far, even if the evaluation was interrupted
+        flush_new_entries()
+
+def _evaluate_benchmark_dedup(texts, tagger, auto_layer, gold_layer, overwrite_existing, ignore_errors, 
+                              output_cache=None, model_files=None, profiler=None):
+    ''' [Internal] Tags each unique sentence of texts only once (or takes its output from 
+        the output_cache), and scores all gold spans of the sentence against the tagger's 
+        output. Returns a boolean correctness vector in the original order of texts. '''
+    correct = np.zeros(len(texts), dtype=bool)
+    for rows, predicted_spans in _iter_sentence_predictions(texts, tagger, auto_layer, overwrite_existing, 
+                                                            ignore_errors, output_cache=output_cache, 
+                                                            model_files=model_files, profiler=profiler):
+        with _profile_stage(profiler, 'scoring'):
+            gold_spans = _gold_spans_of_rows(texts, rows, gold_layer)
+            correct[rows] = _match_spans_exact(gold_spans, predicted_spans)
+    return correct
+
+# Tagger of the current worker process (used only in parallel evaluation)
+_worker_tagger = None
+
+def _init_worker_tagger(tagger):
+    ''' [Internal] Initializes tagger of a worker process. 
+        If tagger is a factory function, builds the tagger once per process. '''
+    global _worker_tagger
+    if isinstance(tagger, (Tagger, MultiLayerTagger)):
+        _worker_tagger = tagger
+    else:
+        _worker_tagger = tagger()
+
+def _evaluate_shard(shard_texts, auto_layer, gold_layer, overwrite_existing, ignore_errors, profile=False):
+    ''' [Internal] Evaluates a shard of gold standard texts in a worker process. 
+        Returns a boolean correctness vector of the shard and the shard's profiler 
+        (None if profile is False). '''
+    profiler = EvaluationProfiler() if profile else None
+    correct = np.zeros(len(shard_texts), dtype=bool)
+    for i, eval_sentence in enumerate(shard_texts):
+        correct[i] = _evaluate_sentence(eval_sentence, _worker_tagger, auto_layer, 
+                                        gold_layer=gold_layer, 
+                                        overwrite_existing=overwrite_existing, 
+                                        ignore_errors=ignore_errors, profiler=profiler)
+    return correct, profiler
+
+def _evaluate_benchmark_parallel(texts, tagger, auto_layer, gold_layer, overwrite_existing, 
+                                 ignore_errors, workers, shards_per_worker=4, profiler=None):
+    ''' [Internal] Shards texts across a pool of worker processes and evaluates the tagger on 
+        each shard. Returns a boolean correctness vector in the original order of texts. '''
+    n_shards = max(1, min(len(texts), workers * shards_per_worker))
+    shard_bounds = np.linspace(0, len(texts), n_shards + 1).astype(int)
+    shards = [texts[start:end] for start, end in zip(shard_bounds[:-1], shard_bounds[1:])]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_tagger, 
+                             initargs=(tagger,)) as executor:
+        futures = [executor.submit(_evaluate_shard, shard, auto_layer, gold_layer, 
+                                   overwrite_existing, ignore_errors, profiler is not None) \
+                   for shard in shards]
+        with tqdm(total=len(texts)) as progress:
+            for future, shard in zip(futures, shards):
+                future.add_done_callback(lambda f, n=len(shard): progress.update(n))
+            # Collect results in the shard order (== the original order of texts)
+            results = [future.result() for future in futures]
+    if profiler is not None:
+        for shard_correct, shard_profiler in results:
+            profiler.merge(shard_profiler)
+    results = [shard_correct for shard_correct, shard_profiler in results]
+    return np.concatenate(results) if results else np.zeros(0, dtype=bool)
+
+def evaluate_benchmark(benchmark_data, tagger, auto_layer=None, 
+                       gold_layer='_gold_ner', method='precise_recall', 
+                       overwrite_existing=True, ignore_errors=False, workers=None, dedup=False, 
+                       profiler=None, output_cache=None, model_files=None):
+    '''
+    Evaluates tagger on the benchmark_data. Returns DataFrame with columns 'correct' 
+    ('yes' or 'no') and 'population', aligned with the rows of benchmark_data.
+    
+    If dedup is True, then rows are grouped by the sentence text, and the tagger is 
+    applied only once on each unique sentence (on the Text object of the first row 
+    of the sentence). All gold spans of the sentence are then scored against the 
+    tagger's output, and the verdicts are spread back to the original rows. 
+    
+    If workers > 1, then benchmark_data is split into consecutive shards, which are 
+    tagged in a pool of worker processes. In that case, tagger can also be a function 
+    without arguments that creates the tagger (the tagger will be built once in each 
+    worker process), but then auto_layer must be provided. Note that layers created 
+    in worker processes will not be added to texts of benchmark_data.
+    
+    If profiler (an EvaluationProfiler) is provided, then collects timings of evaluation 
+    stages and per-sentence tagger latencies into the profiler.
+    
+    If output_cache (a TaggerOutputCache) is provided, then tagger outputs are looked up 
+    from the cache by the tagger_fingerprint(tagger, model_files) and the sentence hash, 
+    and only sentences missing from the cache are tagged (once per unique sentence). 
+    Note that in this case, tagger's output layers are not added to texts that were 
+    found in the cache. Cannot be used together with workers > 1.
+    '''
+    if auto_layer is None:
+        # Try to detect name of the ner layer automatically
+        auto_layer = _detect_output_layer(tagger)
+    texts = list(benchmark_data.text)
+    if dedup and workers is not None and workers > 1:
+        raise ValueError('(!) Deduplicated evaluation (dedup=True) cannot be used with workers > 1.')
+    if output_cache is not None and workers is not None and workers > 1:
+        raise ValueError('(!) Tagger output cache (output_cache) cannot be used with workers > 1.')
+    if profiler is not None:
+        profiler.start()
+    if dedup or output_cache is not None:
+        correct = _evaluate_benchmark_dedup(texts, tagger, auto_layer, gold_layer, 
+                                            overwrite_existing, ignore_errors, output_cache=output_cache, 
+                                            model_files=model_files, profiler=profiler)
+    elif workers is not None and workers > 1:
+        correct = _evaluate_benchmark_parallel(texts, tagger, auto_layer, gold_layer, 
+                                               overwrite_existing, ignore_errors, workers, 
+                                               profiler=profiler)
+    else:
+        correct = np.zeros(len(texts), dtype=bool)
+        for i, eval_sentence in enumerate( tqdm(texts, total=len(texts)) ):
+            correct[i] = _evaluate_sentence(eval_sentence, tagger, auto_layer, 
+                                            gold_layer=gold_layer, 
+                                            overwrite_existing=overwrite_existing, 
+                                            ignore_errors=ignore_errors, profiler=profiler)
+    if profiler is not None:
+        profiler.stop()
+    return pd.DataFrame({'correct': np.where(correct, 'yes', 'no'), 
+                         'population': benchmark_data.population.to_numpy()})
+
+
+def evaluate_benchmark_multi(benchmark_data, taggers, auto_layers=None, 
+                             gold_layer='_gold_ner', overwrite_existing=True, ignore_errors=False, 
+                             profilers=None):
+    '''
+    Evaluates multiple taggers on the benchmark_data in a single pass: prerequisite layers 
+    of each sentence are computed only once, and then all taggers are applied on the sentence. 
+    Returns boolean correctness matrix of shape (len(taggers), len(benchmark_data)), aligned 
+    with the rows of benchmark_data.
+    If profilers (a list of EvaluationProfiler-s, one for each tagger) is provided, then 
+    collects timings of each tagger into its profiler. Timings of the shared prerequisite 
+    layers are recorded into a separate profiler, which is merged into all profilers. 
+    '''
+    if profilers is None:
+        profilers = [None] * len(taggers)
+    if auto_layers is None:
+        auto_layers = [None] * len(taggers)
+    if len(auto_layers) != len(taggers):
+        raise ValueError(f'(!) Number of auto_layers ({len(auto_layers)}) does not match the '+\
+                         f'number of taggers ({len(taggers)}).')
+    # Try to detect names of the ner layers automatically
+    auto_layers = [_detect_output_layer(tagger) if auto_layer is None else auto_layer \
+                   for tagger, auto_layer in zip(taggers, auto_layers)]
+    texts = list(benchmark_data.text)
+    return _evaluate_texts_multi(texts, len(texts), taggers, auto_layers, gold_layer, 
+                                 overwrite_existing, ignore_errors, profilers)
+
+def _evaluate_texts_multi(texts, texts_count, taggers, auto_layers, gold_layer, overwrite_existing, 
+                          ignore_errors, profilers):
+    ''' [Internal] Evaluates taggers on an iterable of texts_count texts in a single pass. 
+        Returns boolean correctness matrix of shape (len(taggers), texts_count). '''
+    shared_profiler = EvaluationProfiler() if any(profilers) else None
+    correct = np.zeros((len(taggers), texts_count), dtype=bool)
+    for profiler in profilers:
+        if profiler is not None:
+            profiler.start()
+    for i, eval_sentence in enumerate( tqdm(texts, total=texts_count) ):
+        # Add prerequisite layers (shared by all taggers)
+        with _profile_stage(shared_profiler, 'prerequisites'):
+            eval_sentence.tag_layer()
+        for j, (tagger, auto_layer) in enumerate( zip(taggers, auto_layers) ):
+            correct[j, i] = _evaluate_sentence(eval_sentence, tagger, auto_layer, 
+                                               gold_layer=gold_layer, 
+                                               overwrite_existing=overwrite_existing, 
+                                               ignore_errors=ignore_errors, 
+                                               add_prerequisites=False, 
+                                               profiler=profilers[j])
+    for profiler in profilers:
+        if profiler is not None:
+            profiler.stop(sentences=texts_count)
+            profiler.merge(shared_profiler)
+    return correct
 
 
-def find_recall_estimate(eval_results, description_file='data_description.csv', verbose=False):
+def evaluate_benchmark_streaming(description_file, taggers, populations, auto_layers=None, 
+                                 gold_layer='_gold_ner', overwrite_existing=True, ignore_errors=False, 
+                                 profilers=None):
+    '''
+    Evaluates taggers in the streaming (low-memory) mode: gold standard items are loaded 
+    lazily from recall set files listed in the description_file, and each Text object 
+    (along with all its layers) is dropped right after it has been scored. Only compact 
+    arrays of population codes and correctness are kept in memory. 
+    Returns a tuple (population_codes, correct_matrix), where population_codes is an 
+    integer array of length items (indexes of item populations in populations), and 
+    correct_matrix is a boolean matrix of shape (len(taggers), items).
+    '''
+    if auto_layers is None:
+        auto_layers = [None] * len(taggers)
+    if profilers is None:
+        profilers = [None] * len(taggers)
+    auto_layers = [_detect_output_layer(tagger) if auto_layer is None else auto_layer \
+                   for tagger, auto_layer in zip(taggers, auto_layers)]
+    desc = read_csv(description_file)
+    population_codes = np.repeat(encode_populations(desc.population, populations).astype(np.int32), 
+                                 desc.positive.to_numpy())
+    texts = (text_obj for population, text_obj in 
+             iter_evaluation_data(description_file=description_file, gold_layer=gold_layer))
+    correct = _evaluate_texts_multi(texts, len(population_codes), taggers, auto_layers, gold_layer, 
+                                    overwrite_existing, ignore_errors, profilers)
+    return population_codes, correct
+
+
+# =================================================================
+#  Evaluation based on precomputed tagger predictions
+# =================================================================
+
+def sentence_hash(text_str):
+    '''Returns sha1 hex digest of the sentence text (used to align predictions with gold data).'''
+    return hashlib.sha1(text_str.encode('utf-8')).hexdigest()
+
+def benchmark_sentences(description_file='data_description.csv'):
+    '''Returns a list of unique sentence texts of the benchmark (in the order of the first 
+       appearance). Can be used to distribute the tagging of the benchmark to other machines.'''
+    return list(dict.fromkeys(text_str for population, text_str, span in 
+                              _iter_recall_set_rows(description_file=description_file)))
+
+def export_tagger_predictions(sentences, tagger, predictions_file, auto_layer=None, ignore_errors=False):
+    '''
+    Tags sentences with the tagger and writes predictions into the predictions_file 
+    (JSONL format). Each line is a JSON object: 
+       {"sentence_hash": sentence_hash(text), "spans": [[start, end, nertag], ...]}
+    Sentences can be strings or Text objects. 
+    The resulting file can be scored with RecallEstimator.evaluate_prediction_file(...).
+    '''
+    if auto_layer is None:
+        auto_layer = _detect_output_layer(tagger)
+    with open(predictions_file, 'w', encoding='utf-8') as out_f:
+        for sentence in tqdm(sentences):
+            text_obj = Text(sentence) if isinstance(sentence, str) else sentence
+            nerspans = _tag_sentence(text_obj, tagger, auto_layer, ignore_errors=ignore_errors)
+            prediction = {'sentence_hash': sentence_hash(text_obj.text), 
+                          'spans': [[span.start, span.end, span.nertag] for span in nerspans]}
+            out_f.write(json.dumps(prediction, ensure_ascii=False) + '\n')
+
+def load_predictions(predictions_file):
+    '''Loads predictions from the JSONL predictions_file (see export_tagger_predictions(...)). 
+       Returns a dictionary mapping sentence hashes to lists of (start, end, nertag) tuples. 
+       If a sentence has multiple prediction lines, then their spans are merged.'''
+    predictions = defaultdict(set)
+    with open(predictions_file, 'r', encoding='utf-8') as in_f:
+        for line_no, line in enumerate(in_f):
+            if len(line.strip()) == 0:
+                continue
+            try:
+                prediction = json.loads(line)
+                spans = {(int(start), int(end), nertag) for start, end, nertag in prediction['spans']}
+                predictions[prediction['sentence_hash']].update(spans)
+            except Exception as parsing_err:
+                raise ValueError(f'(!) {predictions_file!r}:{line_no}: unable to parse prediction: {parsing_err}') from parsing_err
+    # nertag can be None (unlabelled spans), which cannot be compared with strings
+    return {key: sorted(spans, key=lambda s: (s[0], s[1], s[2] is not None, s[2] or ''))
+            for key, spans in predictions.items()}
+
+def evaluate_predictions(description_file, predictions, allow_missing=False):
+    '''
+    Evaluates precomputed predictions (a dictionary produced by load_predictions(...)) 
+    on the benchmark described by description_file. Predictions are aligned with gold 
+    standard items via the hash index of sentences. 
+    If allow_missing is False (default), then raises ValueError in case of sentences 
+    without predictions. Otherwise, such sentences are taken as sentences where no 
+    entities were detected. 
+    Returns a boolean correctness vector aligned with the gold standard items.
+    '''
+    sentence_rows = defaultdict(list)
+    gold_spans = []
+    for i, (population, text_str, span) in enumerate(_iter_recall_set_rows(description_file=description_file)):
+        sentence_rows[sentence_hash(text_str)].append(i)
+        gold_spans.append( (span['start'], span['end'], span['labels'][0]) )
+    missing = [key for key in sentence_rows.keys() if key not in predictions]
+    if missing and not allow_missing:
+        raise ValueError(f'(!) Predictions are missing for {len(missing)} / {len(sentence_rows)} '+\
+                         f'sentences of the benchmark {description_file!r}.')
+    correct = np.zeros(len(gold_spans), dtype=bool)
+    for key, rows in sentence_rows.items():
+        correct[rows] = _match_spans_exact([gold_spans[i] for i in rows], predictions.get(key, []))
+    return correct
+
+
+def find_recall_estimate(eval_results, description_file='data_description.csv', verbose=False, 
+                         method='precise_recall'):
     '''
     Finds recall estimate based on the given sub-sample evaluation results. 
     
@@ -451,60 +2046,32 @@ def find_recall_estimate(eval_results, description_file='data_description.csv',
     Based on:
     https://en.wikipedia.org/wiki/Binomial_proportion_confidence_interval#Standard_error_of_a_proportion_estimation_when_using_weighted_data
 
-    TODO: Correct and hard version
-    # https://stats.stackexchange.com/questions/485266/better-confidence-intervals-for-weighted-average
-    # find a convolution of distributions 
-    # https://medium.com/analytics-vidhya/sum-of-two-random-variables-or-the-rocky-path-to-understanding-convolutions-of-probability-b0fc29aca3b5
-    # https://stackoverflow.com/questions/66218036/question-on-discrete-convolution-with-python
-    # https://numpy.org/doc/stable/reference/generated/numpy.convolve.html
-    # https://stackoverflow.com/questions/28901221/faster-convolution-of-probability-density-functions-in-python
+    If method='exact_convolution', then confidence intervals are found from the 
+    convolution of the per-population binomial distributions instead (see 
+    convolution_confidence_intervals(...)), and if method='bootstrap', then via the 
+    stratified bootstrap (see bootstrap_confidence_intervals(...)). 
     '''
-    # Collect populations used in the evaluation
-    populations = []
-    populations_count = defaultdict(int)
-    last_pop = None
-    for pop in eval_results.population:
-        if pop not in populations:
-            populations.append(pop)
-        populations_count[pop] += 1
-        if populations_count[pop] > 1 and last_pop != pop:
-            # Validate that all examples of a population are consecutive. 
-            # (If not, then our weight calculations do not work)
-            raise ValueError(f'(!) Non-consecutive examples of the population {pop!r}: '+
-                             f'unexpectedly previous example is from another population {last_pop!r}.')
-        last_pop = pop
-    #print(populations)
-    # Find corpus statistics
-    corpus_stats = corpus_statistics(description_file=description_file)
-    # Observed positives -> estimated positives -> total estimated positives
-    total_positives = corpus_stats['estimated_positives'].sum()
-    # Construct weight vector
-    weight_vector = []
-    for pop in populations:
-        positives = corpus_stats.loc[corpus_stats['population']==pop, 'positive'].iloc[0]
-        estimated_positives = corpus_stats.loc[corpus_stats['population']==pop, 'estimated_positives'].iloc[0]
-        pop_weight = estimated_positives/(positives*total_positives)
-        #print(pop, pop_weight, int(positives))
-        if verbose:
-            # Print detailed information about the population, including the number of correctly detected entities
-            correct_labels = eval_results.correct.loc[len(weight_vector):len(weight_vector)+int(positives)-1]
-            assert int(positives) == len(correct_labels)
-            correct_count = (correct_labels.value_counts()).get('yes', 0)
-            correct_percentage = correct_count/(int(positives))*100.0
-            weighted_correct_percentage = (correct_count * pop_weight)*100.0
-            print(f' population: {pop!r} | weight: {pop_weight} | '+\
-                  f'raw correct: {correct_count} / {int(positives)} ({correct_percentage:.1f}%) | '+\
-                  f'weighted correct: {weighted_correct_percentage:.3f}%')
-        weight_vector += ([pop_weight] * positives)
-    # Construct correct assignments vector
-    # Assume binomial distribution (1==match, 0==mismatch)
-    correct_vector = []
-    for correct in eval_results.correct:
-        correct_vector.append( 1 if correct=='yes' else 0 )
-    correct_vector = np.array(correct_vector)
-    # Calculate sample mean and conf interval (for a 95% confidence level)
-    sample_mean = np.matmul(weight_vector, correct_vector)
-    standard_error = np.sqrt(sample_mean * (1-sample_mean) * np.sum(np.square(weight_vector)))
-    confidence_interval = (float(sample_mean - standard_error * 1.96), float(sample_mean + standard_error * 1.96))
-    return { 'Recall': float(sample_mean), 'Recall-95CI%': confidence_interval }
+    populations, weights, positives = population_weights(description_file=description_file)
+    population_codes = encode_populations(eval_results.population, populations)
+    correct_vector = (np.asarray(eval_results.correct) == 'yes')
+    if verbose:
+        _print_population_details(correct_vector, population_codes, populations, weights)
+    recalls, lowers, uppers = estimate_recalls(correct_vector, population_codes, weights, 
+                                               positives=positives, method=method)
+    confidence_interval = (float(lowers[0]), float(uppers[0]))
+    return { 'Recall': float(recalls[0]), 'Recall-95CI%': confidence_interval }
+
 
+def _print_population_details(correct_vector, population_codes, populations, weights):
+    '''Prints detailed information about evaluated populations, including the number of 
+       correctly detected entities.'''
+    correct_counts = population_correct_counts(correct_vector, population_codes, len(populations))[0]
+    item_counts = np.bincount(population_codes, minlength=len(populations))
+    for pop_id in np.unique(population_codes):
+        pop, pop_weight = populations[pop_id], weights[pop_id]
+        correct_count, total_count = int(correct_counts[pop_id]), int(item_counts[pop_id])
+        correct_percentage = correct_count/total_count*100.0
+        weighted_correct_percentage = (correct_count * pop_weight)*100.0
+        print(f' population: {pop!r} | weight: {pop_weight} | '+\
+              f'raw correct: {correct_count} / {total_count} ({correct_percentage:.1f}%) | '+\
+              f'weighted correct: {weighted_correct_percentage:.3f}%')
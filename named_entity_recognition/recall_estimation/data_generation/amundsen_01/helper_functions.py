@@ -1,6 +1,11 @@
 import configparser
 import os, os.path
 import ast
+import hashlib
+import warnings
+from bisect import bisect_left, insort
+
+from pandas import read_csv, DataFrame
 
 from estnltk.storage.postgres import PostgresStorage
 
@@ -92,28 +97,63 @@ def load_term_subpopulations(subpop_dir='config/subpopulations', remove_substr='
 
 
 def count_terms_by_subpopulations(sampler, subpopulations_dir='config/subpopulations'):
-    raw_term_counts = sampler.get_attribute_counts()
-    term_subpopulations = load_term_subpopulations(subpopulations_dir)
-    subpopulation_counts = { k: 0 for k in term_subpopulations.keys() }
-    for (term, term_count) in raw_term_counts:
-        for subpop in term_subpopulations.keys():
-            if term in term_subpopulations[subpop]:
-                subpopulation_counts[subpop] += term_count
-                break
-    return subpopulation_counts
+    # Load subpopulations into the sampler's database and count their occurrences there
+    sampler.load_subpopulations( load_term_subpopulations(subpopulations_dir) )
+    return sampler.get_subpopulation_counts()
+
+
+def update_data_description(sampler, description_file='data_description.csv', 
+                                     subpopulations_dir='config/subpopulations'):
+    '''
+    Updates the occurences column of the dataset description CSV file with subpopulation 
+    counts from the sampler's database (see count_terms_by_subpopulations), recomputes 
+    the columns depending on it (occurence_ratio and relative_frequency) and saves the file. 
+    Returns the updated DataFrame.
+    '''
+    subpopulation_totals = count_terms_by_subpopulations(sampler, subpopulations_dir=subpopulations_dir)
+    df = read_csv(description_file, index_col=0)
+    missing = [s_pop for s_pop in df['population'] if s_pop not in subpopulation_totals]
+    if missing:
+        raise ValueError(f'(!) No subpopulations {missing!r} in {subpopulations_dir!r}.')
+    df['occurences'] = [subpopulation_totals[s_pop] for s_pop in df['population']]
+    df['occurence_ratio'] = df['occurences']/sum(df['occurences'])
+    df['relative_frequency'] = df['occurence_ratio'] * df['positive']/sum(df['occurence_ratio'] * df['positive'])
+    df.to_csv(description_file)
+    return df
 
 
 class DuplicatesChecker:
-    '''Validates that recall_set items are in correct format and do not contain duplicates.'''
+    '''
+    Validates that recall_set items are in correct format and do not contain duplicates.
+    
+    Annotations are indexed by hashes of texts: for each text, spans are kept in a list 
+    sorted by locations (start, end). Items can be checked one by one (check_for_duplicates), 
+    or a whole recall set can be checked at once (check_recall_set). 
+    '''
 
     def __init__(self, validate=True):
-        self.seen_text_annotations=dict()
+        # text hash -> sorted list of (start, end, entry_id, labels, span, row)
+        self.text_annotations=dict()
         self.validate=validate
+        self._entry_count=0
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def parse_entry(self, text, span):
+        '''Parses (and validates, if required) recall_set item. Returns span as a dictionary.'''
+        if isinstance(span, str):
+            span = ast.literal_eval( span )
+        if self.validate:
+            self.validate_entry(text, span)
+        return span
 
     def validate_entry(self, text, span):
         assert isinstance(text, str), f'(!) text is not string, but {type(text)}.'
-        assert isinstance(span, str), f'(!) span is not string, but {type(span)}.'
-        span = ast.literal_eval( span )
+        assert isinstance(span, (str, dict)), f'(!) span is not string nor dict, but {type(span)}.'
+        if isinstance(span, str):
+            span = ast.literal_eval( span )
         assert 'start' in span,  f'(!) {span}: span is missing "start" attribute'
         assert 'end' in span,    f'(!) {span}: span is missing "end" attribute'
         assert 'labels' in span, f'(!) {span}: span is missing "labels" attribute'
@@ -125,19 +165,84 @@ class DuplicatesChecker:
         elif len(span['text']) == 0:
             raise Exception(f'(!) Annotation error: span.text cannot be empty string.')
 
+    def _new_entry(self, span, row=None):
+        self._entry_count += 1
+        return (span['start'], span['end'], self._entry_count, span['labels'], span, row)
+
     def check_for_duplicates(self, text, span):
-        if self.validate:
-            self.validate_entry(text, span)
-        span = ast.literal_eval( span )
-        if text not in self.seen_text_annotations:
-            self.seen_text_annotations[text] = []
-        assert span not in self.seen_text_annotations[text], \
-             f'(!) duplicate entry: {span} already annotated for {text!r}'
-        # Check for matching location but different labels
-        for prev_span in self.seen_text_annotations[text]:
-            if prev_span['start'] == span['start'] and \
-               prev_span['end'] == span['end'] and \
-               prev_span['labels'] != span['labels']:
+        span = self.parse_entry(text, span)
+        entries = self.text_annotations.setdefault(self.text_hash(text), [])
+        # Check previous annotations at the same location
+        i = bisect_left(entries, (span['start'], span['end']))
+        while i < len(entries) and entries[i][:2] == (span['start'], span['end']):
+            prev_span = entries[i][4]
+            assert prev_span != span, \
+                 f'(!) duplicate entry: {span} already annotated for {text!r}'
+            # Matching location but different labels
+            if prev_span['labels'] != span['labels']:
                 raise ValueError(f'(!) span {span["text"]!r} annotated with different labels: '+\
                                  f'{span["labels"]!r} vs {prev_span["labels"]!r}.')
-        self.seen_text_annotations[text].append(span)
\ No newline at end of file
+            i += 1
+        insort(entries, self._new_entry(span))
+
+    def check_recall_set(self, data):
+        '''
+        Checks all items of a recall set (a DataFrame or a name of a CSV file with columns 
+        text and span) at once, also against items checked before. Finds exact duplicates, 
+        label conflicts (matching locations, but different labels) and partially overlapping 
+        spans of the same text. Spans are parsed only once, and the overlaps are found by 
+        sweeping over the spans of each text in the order of locations. 
+        
+        Returns a DataFrame with columns problem ('duplicate', 'label_conflict' or 'overlap'), 
+        row, other_row (row of the other item, which can also come from a recall set checked 
+        before, or None for items checked by check_for_duplicates), text, span and other_span. 
+        Raises ValueError if duplicates or label conflicts are found (partial overlaps 
+        are only reported). 
+        '''
+        if isinstance(data, str):
+            filename = data
+            try:
+                data = read_csv(filename)
+            except Exception as csv_parsing_err:
+                raise ValueError(f'(!) Bad input file format: unable to open {filename!r} as a CSV file: ') from csv_parsing_err
+        # Parse spans and group them by texts
+        new_entries = dict()
+        texts = dict()
+        for row, text, span in zip(data.index, data.text, data.span):
+            text_hash = self.text_hash(text)
+            new_entries.setdefault(text_hash, []).append( self._new_entry(self.parse_entry(text, span), row=row) )
+            texts[text_hash] = text
+        problems = []
+        for text_hash, entries in new_entries.items():
+            old_entries = self.text_annotations.get(text_hash, [])
+            min_new_entry_id = entries[0][2]
+            merged = sorted(old_entries + entries)
+            # Sweep over spans sorted by start: active spans are the ones that 
+            # end after the start of the current span, i.e. overlap with it
+            active = []
+            for entry in merged:
+                start, end, entry_id, labels, span, row = entry
+                active = [a for a in active if a[1] > start]
+                for a in active:
+                    if a[2] < min_new_entry_id and entry_id < min_new_entry_id:
+                        # Both items have been checked before
+                        continue
+                    if (a[0], a[1]) == (start, end):
+                        problem = 'duplicate' if a[4] == span else \
+                                  ('label_conflict' if a[3] != labels else None)
+                    else:
+                        problem = 'overlap'
+                    if problem is not None:
+                        first, second = (a, entry) if a[2] < entry_id else (entry, a)
+                        problems.append( (problem, second[5], first[5], texts[text_hash], second[4], first[4]) )
+                active.append(entry)
+            self.text_annotations[text_hash] = merged
+        report = DataFrame(problems, columns=['problem', 'row', 'other_row', 'text', 'span', 'other_span'])
+        errors = report[report.problem != 'overlap']
+        if len(errors) > 0:
+            raise ValueError(f'(!) {len(errors)} duplicate(s) or label conflict(s) found, e.g. '+\
+                             f'{errors.span.iloc[0]} vs {errors.other_span.iloc[0]} in {errors.text.iloc[0]!r}.')
+        if len(report) > 0:
+            warnings.warn(f'(!) {len(report)} partially overlapping span(s) found, e.g. '+\
+                          f'{report.span.iloc[0]} vs {report.other_span.iloc[0]} in {report.text.iloc[0]!r}.')
+        return report
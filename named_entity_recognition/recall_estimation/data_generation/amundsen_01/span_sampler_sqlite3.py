@@ -1,34 +1,90 @@
 from random import Random
 from random import sample, choices
+from copy import deepcopy
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import ast
 import sqlite3
 import warnings
 
+import numpy as np
 from tqdm import tqdm
 
-from estnltk.storage.postgres import LayerQuery, IndexQuery
+from estnltk.storage.postgres import LayerQuery, IndexQuery, SliceQuery
 from estnltk.storage.postgres import PgCollection
 
 
+def find_term_locations(key, txt, layer, attribute, terms_set):
+    '''
+    Finds locations of all terms of terms_set in the layer of the given text. 
+    Returns list of rows (layer_id, attribute_value, span_index, total_spans), 
+    where total_spans is the number of spans of the term in the text. 
+    '''
+    term_indices = {}
+    for i, values in enumerate(txt[layer][attribute]):
+        # Note: only the first value of an ambiguous span is considered
+        if values[0] in terms_set:
+            term_indices.setdefault(values[0], []).append(i)
+    rows = []
+    for term, indices in term_indices.items():
+        rows.extend( (key, term, i, len(indices)) for i in indices )
+    return rows
+
+
+def prefetched(items, batch_size=1000, prefetch=2):
+    '''
+    Iterates over items, which are read in batches of batch_size items in a background 
+    thread: while the current batch is being processed, at most prefetch next batches 
+    are read ahead. Batches are read one at a time (so that a collection's connection 
+    is only used by one thread at a time). If prefetch is 0, then items are iterated 
+    directly. Yields items in the original order. 
+    '''
+    if prefetch < 1:
+        yield from items
+        return
+    iterator = iter(items)
+    def fetch_batch():
+        return list(islice(iterator, batch_size))
+    with ThreadPoolExecutor(max_workers=1) as fetch_pool:
+        fetching = deque(fetch_pool.submit(fetch_batch) for i in range(prefetch))
+        while True:
+            batch = fetching.popleft().result()
+            if not batch:
+                break
+            fetching.append( fetch_pool.submit(fetch_batch) )
+            yield from batch
+
+
 class SpanSampler:
     """
     SpanSampler that creates subsamples based on subsets of (geographical) terms. 
     """
 
-    def __init__(self, collection, layer, attribute, termsfile, db_file_name='geo_terms_sample.db', seed=1, verbose=False):
+    def __init__(self, collection, layer, attribute, termsfile, db_file_name='geo_terms_sample.db', seed=1, verbose=False, migrate=False):
         self.verbose = verbose
         # Use local sqlite3 database for sampling
         assert isinstance(db_file_name, str)
         self._db_file_name = db_file_name
         self._connection = sqlite3.connect(self._db_file_name)
         self._cursor = self._connection.cursor()
-        # Use data from a PostgreSQL collection
-        assert isinstance(collection, PgCollection), \
+        # Cache of term codes (term -> term_id in the terms table)
+        self._term_ids = {}
+        # Use data from a PostgreSQL collection, or from any other collection that 
+        # supports select(query, layers, return_index) and provides index_query(ids) 
+        # and layer_query(layer, **attribute_values) (see common/text_collections.py)
+        assert isinstance(collection, PgCollection) or hasattr(collection, 'select'), \
             f'(!) Unexpected data type {type(collection)!r} for collection. '+\
-            f'Expected estnltk.storage.postgres.PgCollection.'
+            f'Expected estnltk.storage.postgres.PgCollection or a collection with select(...) method.'
         self.collection = collection
         self.layer = layer
         self.attribute = attribute
         self.terms = []
+        # Cache of in-memory sampling indexes (one for each set of attribute values)
+        self._sampling_index_cache = {}
+        # Sampling index selected by create_sampling_matrix (deprecated)
+        self._sampling_matrix = None
+        self.seed = seed
         self.random = Random()
         self.random.seed( seed )
         with open(termsfile, 'r', encoding='UTF-8') as in_f:
@@ -37,10 +93,37 @@ class SpanSampler:
                     self.terms.append( line.strip() )
         if self.verbose:
             print(f'Loaded {len(self.terms)} terms from {termsfile}.')
+        if self._has_legacy_schema():
+            if not migrate:
+                raise ValueError(f'(!) {self._db_file_name!r} uses the old (non-encoded) schema of attribute_locations '+\
+                                 f'table. Use migrate=True to convert the database to the dictionary-encoded '+\
+                                 f'schema (note: the conversion cannot be undone, and the converted database '+\
+                                 f'cannot be used by older versions of the sampler).')
+            if self.verbose:
+                print(f'Migrating {self._db_file_name!r} to the dictionary-encoded schema.')
+            self.migrate_database()
+
+    def _index_query(self, ids):
+        if isinstance(self.collection, PgCollection):
+            return IndexQuery(ids)
+        return self.collection.index_query(ids)
+
+    def _layer_query(self, term):
+        if isinstance(self.collection, PgCollection):
+            return LayerQuery(self.layer, **{self.attribute: term})
+        return self.collection.layer_query(self.layer, **{self.attribute: term})
+
+    def _slice_query(self, start):
+        if isinstance(self.collection, PgCollection):
+            return SliceQuery(start, None)
+        return self.collection.slice_query(start)
 
     # =====================================================================
     #   attribute_locations table (used as a basis for sampling)
     # =====================================================================
+    #   Terms are dictionary-encoded: attribute_locations refers to terms 
+    #   by term_id, and term strings are kept in the terms lookup table. 
+    # =====================================================================
 
     def attribute_locations_table_exists(self):
         self._cursor.execute("""SELECT EXISTS (
@@ -51,31 +134,228 @@ class SpanSampler:
         res = self._cursor.fetchall()
         return res[0][0]
 
-    def create_attribute_locations_table(self):
-        if not self.attribute_locations_table_exists():
-            self._cursor.execute(
-                "CREATE TABLE attribute_locations (layer_id integer, attribute_value varchar, span_index integer, total_spans integer);")
+    def _set_bulk_load_pragmas(self):
+        # Tune sqlite for bulk loading: no fsync after each transaction, 
+        # write-ahead log, temporary data and a large page cache in memory. 
+        # The journal mode persists in the database file, so the original 
+        # settings are recorded and restored after the load (_reset_pragmas)
+        self._cursor.execute("PRAGMA journal_mode;")
+        journal_mode = self._cursor.fetchone()[0]
+        self._cursor.execute("PRAGMA synchronous;")
+        synchronous = self._cursor.fetchone()[0]
+        self._saved_pragmas = (journal_mode, synchronous)
+        self._cursor.execute("PRAGMA journal_mode=WAL;")
+        self._cursor.execute("PRAGMA synchronous=OFF;")
+        self._cursor.execute("PRAGMA temp_store=MEMORY;")
+        self._cursor.execute("PRAGMA cache_size=-262144;")
+
+    def _reset_pragmas(self):
+        journal_mode, synchronous = getattr(self, '_saved_pragmas', ('delete', 2))
+        self._connection.commit()
+        self._cursor.execute(f"PRAGMA journal_mode={journal_mode};")
+        self._cursor.execute(f"PRAGMA synchronous={int(synchronous)};")
+
+    def _create_tables(self):
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS terms (term_id integer PRIMARY KEY, term varchar UNIQUE NOT NULL);")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS attribute_locations (layer_id integer, term_id integer, span_index integer, total_spans integer);")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS indexing_manifest (term varchar PRIMARY KEY, last_id integer, updated_at varchar);")
+
+    def create_attribute_locations_indexes(self):
+        # Indexes are created after the load, because updating indexes during 
+        # bulk insertion is much slower than building them at once. 
+        # (term_id, layer_id, span_index) covers counting by terms and sampling 
+        # queries, so that these can be answered from the index only 
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS attribute_locations_term_idx ON attribute_locations (term_id, layer_id, span_index);")
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS attribute_locations_layer_idx ON attribute_locations (layer_id);")
+        self._connection.commit()
+
+    def _has_legacy_schema(self):
+        self._cursor.execute("PRAGMA table_info(attribute_locations);")
+        return 'attribute_value' in [row[1] for row in self._cursor.fetchall()]
+
+    def migrate_database(self, vacuum=False):
+        '''
+        Migrates attribute_locations table of the old schema (term strings stored in 
+        attribute_value column) to the dictionary-encoded schema (term codes stored in 
+        term_id column, term strings in the terms table). The order of rows is preserved. 
+        If vacuum is True, then reclaims the space freed by the old table (note that 
+        vacuuming temporarily needs as much free disk space as the database takes). 
+        The migration cannot be undone: older versions of the sampler cannot read 
+        the migrated database. 
+        '''
+        if not self._has_legacy_schema():
+            return
+        self._cursor.execute("BEGIN;")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS terms (term_id integer PRIMARY KEY, term varchar UNIQUE NOT NULL);")
+        self._cursor.execute(
+            "INSERT OR IGNORE INTO terms (term) SELECT DISTINCT attribute_value FROM attribute_locations ORDER BY attribute_value;")
+        self._cursor.execute(
+            "CREATE TABLE attribute_locations_encoded (layer_id integer, term_id integer, span_index integer, total_spans integer);")
+        self._cursor.execute("""
+            INSERT INTO attribute_locations_encoded (layer_id, term_id, span_index, total_spans) 
+            SELECT a.layer_id, t.term_id, a.span_index, a.total_spans 
+            FROM attribute_locations AS a JOIN terms AS t ON t.term = a.attribute_value ORDER BY a.rowid;
+        """)
+        self._cursor.execute("DROP TABLE attribute_locations;")
+        self._cursor.execute("ALTER TABLE attribute_locations_encoded RENAME TO attribute_locations;")
+        self._connection.commit()
+        self.create_attribute_locations_indexes()
+        if vacuum:
+            self._cursor.execute("VACUUM;")
+        self._term_ids = {}
+        self._sampling_index_cache = {}
+
+    def _get_term_ids(self, terms):
+        '''Returns dictionary mapping terms to their codes. Adds missing terms into the terms table.'''
+        missing = [term for term in set(terms) if term not in self._term_ids]
+        if missing:
+            self._cursor.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?);", [(term,) for term in missing])
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i+500]
+                self._cursor.execute(
+                    "SELECT term, term_id FROM terms WHERE term IN (" + ','.join('?' * len(batch)) + ");", batch)
+                self._term_ids.update( self._cursor.fetchall() )
+        return self._term_ids
+
+    def indexing_manifest_table_exists(self):
+        self._cursor.execute("""SELECT EXISTS (
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name='indexing_manifest' 
+            ORDER BY name );
+        """)
+        res = self._cursor.fetchall()
+        return res[0][0]
+
+    def get_indexing_manifest(self):
+        '''
+        Returns dictionary mapping indexed terms to the last collection id (layer_id) 
+        up to which the term has been indexed. That is, the term has been indexed in 
+        all collection texts with ids in range [0, last_id]. 
+        '''
+        if not self.indexing_manifest_table_exists():
+            return {}
+        self._cursor.execute("SELECT term, last_id FROM indexing_manifest;")
+        return dict(self._cursor.fetchall())
+
+    def _checkpoint(self, rows, terms, last_id):
+        # Insert rows and update the manifest in the same transaction, 
+        # so that the manifest always describes the contents of the table
+        term_ids = self._get_term_ids([row[1] for row in rows])
+        self._cursor.executemany(
+            "INSERT INTO attribute_locations (layer_id, term_id, span_index, total_spans) VALUES (?, ?, ?, ?)", 
+            [(key, term_ids[term], i, total) for key, term, i, total in rows] )
+        self._cursor.executemany(
+            "INSERT OR REPLACE INTO indexing_manifest (term, last_id, updated_at) VALUES (?, ?, datetime('now'))", 
+            [(term, last_id) for term in terms] )
+        self._connection.commit()
+
+    def _find_term_locations(self, key, txt, terms_set):
+        return find_term_locations(key, txt, self.layer, self.attribute, terms_set)
+
+    def create_attribute_locations_table(self, single_pass=True, batch_size=50000, checkpoint_texts=10000, 
+                                         prefetch=2):
+        '''
+        Searches all terms from the collection and records their locations into the 
+        attribute_locations table. 
+        If single_pass is True (default), then the layer of the collection is scanned 
+        only once, and spans are matched against a hash set of all terms. Otherwise, 
+        the collection is queried separately for each term (via LayerQuery). 
+        Rows are inserted in transactions of batch_size rows (or after checkpoint_texts 
+        texts), and indexes on term_id and layer_id are created after the load. 
+        Texts are fetched from the collection in a background thread, which reads up to 
+        prefetch batches of texts ahead while the current texts are matched and inserted 
+        (see prefetched); use prefetch=0 to fetch texts in the current thread. 
+        
+        Indexing is resumable and incremental: each transaction also records into the 
+        indexing_manifest table the last collection id up to which terms have been 
+        indexed. If the indexing is interrupted, or new terms are added to the terms 
+        file, or new texts are added to the collection, then calling this method again 
+        only indexes terms and texts that are missing from the manifest. 
+        Assumes that the collection yields texts in the ascending order of ids. 
+        '''
+        if self.attribute_locations_table_exists() and not self.indexing_manifest_table_exists():
+            warnings.warn(f'(!) {self._db_file_name!r} already contains attribute_locations table, but '+\
+                          f'no indexing manifest. Unable to resume indexing. Skipping the table creation.')
+            return
+        self._set_bulk_load_pragmas()
+        try:
+            self._create_tables()
             self._connection.commit()
+            self._sampling_index_cache = {}
+            manifest = self.get_indexing_manifest()
+            last_ids = {term: manifest.get(term, -1) for term in self.terms}
             if self.verbose:
-                print(f'\nIndexing terms ...\n')
-            for term in self.terms:
-                if self.verbose:
-                    print(f'\nSearching for term {term!r} ...\n')
-                q = LayerQuery(self.layer, **{self.attribute: term})
-                for key, txt in tqdm(self.collection.select(query=q, layers=[self.layer])):
-                    indices = [i for i, nertag in enumerate(txt[self.layer][self.attribute]) if nertag[0] == term]
-                    rows = [ (key, term, i, len(indices)) for i in indices ]
-                    self._cursor.executemany(
-                        "INSERT INTO attribute_locations (layer_id, attribute_value, span_index, total_spans) VALUES (?, ?, ?, ?)", rows )
-                    self._connection.commit()
-        else:
-            warnings.warn(f'(!) {self._db_file_name!r} already contains attribute_locations table. Skipping the table creation.')
+                new_terms = [term for term in self.terms if term not in manifest]
+                print(f'\nIndexing terms ({len(new_terms)} new terms) ...\n')
+            if single_pass:
+                self._index_terms_single_pass(last_ids, batch_size, checkpoint_texts, prefetch=prefetch)
+            else:
+                # The largest text id seen so far: as each term query covers the whole 
+                # collection, texts up to this id have been searched for all queried terms 
+                max_key = -1
+                for term in self.terms:
+                    if self.verbose:
+                        print(f'\nSearching for term {term!r} ...\n')
+                    key = self._index_terms_single_pass({term: last_ids[term]}, batch_size, checkpoint_texts, 
+                                                        query=self._layer_query(term), prefetch=prefetch)
+                    max_key = max(max_key, key if key is not None else -1)
+                    # Record every processed term (also terms without matches) into the manifest
+                    self._checkpoint([], [term], max(max_key, last_ids[term]))
+            self.create_attribute_locations_indexes()
+        finally:
+            self._reset_pragmas()
+
+    def _index_terms_single_pass(self, last_ids, batch_size, checkpoint_texts, query=None, prefetch=2):
+        '''
+        Scans the collection (or texts selected by the query) once, and indexes terms 
+        in texts that have not been indexed yet: a term is searched from a text only if 
+        the text id is greater than the term's last_id in last_ids. Texts that have been 
+        indexed for all terms are not fetched from the collection. 
+        Returns the id of the last scanned text (or None, if no texts were scanned). 
+        '''
+        resume_id = min(last_ids.values(), default=-1)
+        if resume_id >= 0:
+            # Only fetch texts after the resume point
+            query = self._slice_query(resume_id + 1) if query is None else \
+                    query & self._slice_query(resume_id + 1)
+        # Thresholds where new terms become active (in the ascending order of ids)
+        thresholds = sorted(set(last_ids.values()))
+        active_terms = set()
+        rows = []
+        texts_count = 0
+        key = None
+        texts = self.collection.select(query=query, layers=[self.layer])
+        for key, txt in tqdm(prefetched(texts, prefetch=prefetch)):
+            if key <= resume_id:
+                continue
+            while thresholds and thresholds[0] < key:
+                threshold = thresholds.pop(0)
+                active_terms.update( term for term, last_id in last_ids.items() if last_id == threshold )
+            rows.extend( self._find_term_locations(key, txt, active_terms) )
+            texts_count += 1
+            if len(rows) >= batch_size or texts_count >= checkpoint_texts:
+                self._checkpoint(rows, active_terms, key)
+                rows = []
+                texts_count = 0
+        if key is not None and key > resume_id:
+            self._checkpoint(rows, active_terms, key)
+        return key
 
     # Find counts of all attribute values
     def get_attribute_counts(self):
         if not self.attribute_locations_table_exists():
             raise Exception('(!) attribute_locations table has not been generated yet.')
-        self._cursor.execute("SELECT attribute_value, COUNT(attribute_value) FROM attribute_locations GROUP BY attribute_value;")
+        self._cursor.execute("""
+        SELECT t.term, c.count FROM (
+            SELECT term_id, COUNT(*) AS count FROM attribute_locations GROUP BY term_id 
+        ) AS c JOIN terms AS t ON t.term_id = c.term_id ORDER BY t.term;
+        """)
         return self._cursor.fetchall()
 
     # Find counts of attribute values grouped by layer_id (each layer counted only once)
@@ -84,9 +364,9 @@ class SpanSampler:
         if not self.attribute_locations_table_exists():
             raise Exception('(!) attribute_locations table has not been generated yet.')
         self._cursor.execute("""
-        SELECT a.attribute_value, COUNT(a.attribute_value) FROM (
-            SELECT layer_id, attribute_value FROM attribute_locations GROUP BY layer_id 
-        ) AS a GROUP BY a.attribute_value;
+        SELECT t.term, COUNT(*) FROM (
+            SELECT layer_id, term_id FROM attribute_locations GROUP BY layer_id 
+        ) AS a JOIN terms AS t ON t.term_id = a.term_id GROUP BY t.term;
         """)
         return self._cursor.fetchall()
 
@@ -101,77 +381,216 @@ class SpanSampler:
             results = [res_tuple[0] for res_tuple in results]
         return results
 
+    # Find counts of attribute values grouped by subpopulations (see load_subpopulations)
+    def get_subpopulation_counts(self):
+        if not self.attribute_locations_table_exists():
+            raise Exception('(!) attribute_locations table has not been generated yet.')
+        if not self.subpopulations_table_exists():
+            raise Exception('(!) subpopulations table has not been loaded yet.')
+        self._cursor.execute("""
+        SELECT s.population, COUNT(a.term_id) FROM subpopulations AS s 
+        LEFT JOIN attribute_locations AS a ON a.term_id = s.term_id 
+        GROUP BY s.population ORDER BY s.population;
+        """)
+        return dict( self._cursor.fetchall() )
+
+    def subpopulations_table_exists(self):
+        return self._table_exists('subpopulations')
+
+    def _table_exists(self, table_name):
+        self._cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
+        return len(self._cursor.fetchall()) > 0
+
+    def load_subpopulations(self, subpopulations):
+        '''
+        Stores subpopulations of terms (a dictionary mapping population name to a set of 
+        terms, see helper_functions.load_term_subpopulations) into the subpopulations table, 
+        replacing previously stored subpopulations. 
+        Each term is assigned to a single subpopulation: if a term belongs to several 
+        subpopulations, then it is assigned to the first one (in the sorted order of 
+        population names), so that its occurrences are counted only once. 
+        '''
+        if not self.attribute_locations_table_exists() or not self._table_exists('terms'):
+            raise Exception('(!) attribute_locations table has not been generated yet.')
+        seen_terms = {}
+        for population in sorted(subpopulations.keys()):
+            for term in subpopulations[population]:
+                if term in seen_terms:
+                    warnings.warn(f'(!) term {term!r} belongs to several subpopulations: '+\
+                                  f'{seen_terms[term]!r} and {population!r}. Counting it only in {seen_terms[term]!r}.')
+                seen_terms.setdefault(term, population)
+        self._cursor.execute("DROP TABLE IF EXISTS subpopulations;")
+        self._cursor.execute(
+            "CREATE TABLE subpopulations (term_id integer PRIMARY KEY, population varchar NOT NULL);")
+        term_ids = self._get_term_ids( seen_terms.keys() )
+        self._cursor.executemany("INSERT INTO subpopulations (term_id, population) VALUES (?, ?);", 
+                                 [(term_ids[term], population) for term, population in seen_terms.items()])
+        self._connection.commit()
+
     def clear_attribute_locations(self):
         self._cursor.execute("DROP TABLE attribute_locations;")
+        self._sampling_index_cache = {}
+        self._cursor.execute("DROP TABLE IF EXISTS indexing_manifest;")
+        self._cursor.execute("DROP TABLE IF EXISTS subpopulations;")
+        self._cursor.execute("DROP TABLE IF EXISTS terms;")
+        self._term_ids = {}
         self._connection.commit()
 
     # =====================================================================
-    #   sampling_matrix table (temporary, used only during sampling)
+    #   in-memory sampling index (used during sampling)
     # =====================================================================
 
-    def sampling_matrix_table_exists(self):
-        self._cursor.execute("""SELECT EXISTS (
-            SELECT name FROM sqlite_master
-            WHERE type='table' AND name='sampling_matrix' 
-            ORDER BY name );
-        """)
-        res = self._cursor.fetchall()
-        return res[0][0]
+    @staticmethod
+    def _normalize_attribute_values(attribute_values):
+        # For backwards compatibility, also allow SQL-formatted tuple strings, e.g. "('a', 'b')"
+        if isinstance(attribute_values, str):
+            try:
+                attribute_values = ast.literal_eval(attribute_values)
+            except (ValueError, SyntaxError):
+                pass
+        if isinstance(attribute_values, str):
+            attribute_values = (attribute_values,)
+        return tuple(sorted(set(attribute_values)))
 
-    def create_sampling_matrix(self, attribute_val):
-        self._cursor.execute("CREATE TABLE sampling_matrix (id INTEGER PRIMARY KEY AUTOINCREMENT, layer INTEGER, span_index INTEGER);")
-        self._cursor.execute(
-            "INSERT INTO sampling_matrix (layer, span_index) SELECT layer_id as layer, span_index FROM attribute_locations WHERE attribute_value IN " + str(
-                attribute_val) + ";")
-        self._connection.commit()
+    def get_sampling_index(self, attribute_values, batch_size=500):
+        '''
+        Returns in-memory sampling index of locations of attribute_values: a tuple of 
+        NumPy arrays (layer_ids, span_indices), in the order of rows of the 
+        attribute_locations table. Indexes are cached for each set of attribute values. 
+        '''
+        values = self._normalize_attribute_values(attribute_values)
+        if values not in self._sampling_index_cache:
+            rows = []
+            for i in range(0, len(values), batch_size):
+                batch = values[i:i+batch_size]
+                self._cursor.execute(
+                    "SELECT a.rowid, a.layer_id, a.span_index FROM attribute_locations AS a WHERE a.term_id IN "+\
+                    "(SELECT term_id FROM terms WHERE term IN (" + ','.join('?' * len(batch)) + "));", batch)
+                rows.extend( self._cursor.fetchall() )
+            rows = np.array(rows, dtype=np.int64).reshape(-1, 3)
+            rows = rows[np.argsort(rows[:, 0], kind='stable')]
+            self._sampling_index_cache[values] = (rows[:, 1].copy(), rows[:, 2].astype(np.int32))
+        return self._sampling_index_cache[values]
 
     def __call__(self, count, attribute_values, return_index=False, with_replacement=True):
         '''
         Samples given amount of spans that meet given conditions (satisfy attribute_values). 
         If with_replacement is True (default) then same span can be sampled several times. 
-        If return_index is True than adds text_ids to the results (default: False).
-        Returns list of type (Text, span) or (int, Text, span).
+        If return_index is True than adds the index of each sampled span to the results 
+        (default: False): its 1-based position in the sampling matrix of attribute_values 
+        (see get_sampling_index), as in find_sampled_indices. 
+        Returns list of type (Text, span) or (int, Text, span), in the order of draws. 
+        If the same text is drawn several times, then each draw gets a separate copy 
+        of the Text object. 
         '''
         if not self.attribute_locations_table_exists():
             self.create_attribute_locations_table()
-        if self.sampling_matrix_table_exists():
-            self.clear_sampling_matrix()
-        self.create_sampling_matrix(attribute_values)
-        indices = self.find_sampled_indices(count, with_replacement)
+        sampling_index = self.get_sampling_index(attribute_values)
+        sampled = self._draw_indices(count, len(sampling_index[0]), with_replacement)
+        texts = self._fetch_texts(sampling_index[0][sampled])
+        return self._make_results(sampling_index, sampled, texts, set(), return_index)
+
+    def _fetch_texts(self, layer_ids):
+        sampled_ids = sorted(set(layer_ids.tolist()))
+        return dict(self.collection.select(query=self._index_query(sampled_ids), layers=[self.layer], return_index=True))
+
+    def _make_results(self, sampling_index, sampled, texts, used_ids, return_index):
+        # If the same text is used several times, then each use gets a separate copy of the Text object.
+        # The index of a span is its 1-based position in the sampling matrix (as in find_sampled_indices)
+        layer_ids, span_indices = sampling_index
         result_list = []
-        only_txt_index = [idx[1] for idx in indices]
-        texts = list(self.collection.select(query=IndexQuery(only_txt_index), layers=[self.layer], return_index=True))
-        for text in texts:
-            idx = [index for index in indices if text[0] == index[1]][0]
+        for i in sampled:
+            text_id = int(layer_ids[i])
+            text = texts[text_id] if text_id not in used_ids else deepcopy(texts[text_id])
+            used_ids.add(text_id)
             if return_index:
-                result_list.append((idx[0], text[1], text[1][self.layer][idx[2]]))
+                result_list.append((int(i)+1, text, text[self.layer][int(span_indices[i])]))
             else:
-                result_list.append((text[1], text[1][self.layer][idx[2]]))
-        self.clear_sampling_matrix()
+                result_list.append((text, text[self.layer][int(span_indices[i])]))
         return result_list
 
-    def find_sampled_indices(self, count, with_replacement):
-        # find sample size
-        self._cursor.execute("SELECT COUNT(*) FROM sampling_matrix;")
-        total_span_count = self._cursor.fetchall()[0][0]
-        # find matrix starting index
-        self._cursor.execute("SELECT * FROM sampling_matrix LIMIT 1;")
-        start_index = self._cursor.fetchall()[0][0]
-        # draw sample
+    def sample_strata(self, strata, return_index=False, with_replacement=True, deduplicate=True):
+        '''
+        Samples several populations (strata) at once. strata is a dictionary mapping 
+        population name to a tuple (count, attribute_values), e.g. 
+        {'levinumad': (1000, levinumad_terms), 'ulejaanud': (1000, ulejaanud_terms)}. 
+        
+        Each stratum is drawn from the in-memory sampling index with its own random 
+        stream, which is seeded by the sampler's seed and the name of the population. 
+        So, the sample of a population does not depend on other strata nor on the 
+        earlier calls of the sampler. All sampled texts are fetched from the collection 
+        with a single query. 
+        
+        If deduplicate is True (default), then a sentence (text) sampled in one stratum 
+        is excluded from the strata that follow it (in the order of the dictionary), so 
+        that each sentence ends up in at most one stratum. Note that this makes the 
+        samples of the following strata dependent on the preceding ones. 
+        
+        Returns a dictionary mapping each population to a list of type (Text, span) or 
+        (int, Text, span), in the order of draws (as in __call__).
+        '''
+        if not self.attribute_locations_table_exists():
+            self.create_attribute_locations_table()
+        draws = {}
+        used_layer_ids = []
+        for population, (count, attribute_values) in strata.items():
+            sampling_index = self.get_sampling_index(attribute_values)
+            rng = Random(f'{self.seed}:{population}')
+            if deduplicate and len(used_layer_ids) > 0:
+                candidates = np.flatnonzero( ~np.isin(sampling_index[0], np.concatenate(used_layer_ids)) )
+                sampled = candidates[self._draw_indices(count, len(candidates), with_replacement, rng=rng)]
+            else:
+                sampled = np.array(self._draw_indices(count, len(sampling_index[0]), with_replacement, rng=rng), 
+                                   dtype=np.int64)
+            used_layer_ids.append( np.unique(sampling_index[0][sampled]) )
+            draws[population] = (sampling_index, sampled)
+        sampled_layer_ids = np.unique( np.concatenate(used_layer_ids) if used_layer_ids else np.array([], dtype=np.int64) )
+        if self.verbose:
+            print(f'Fetching {len(sampled_layer_ids)} sampled texts ...')
+        texts = self._fetch_texts( sampled_layer_ids )
+        used_ids = set()
+        return {population: self._make_results(sampling_index, sampled, texts, used_ids, return_index) 
+                 for population, (sampling_index, sampled) in draws.items()}
+
+    def _draw_indices(self, count, total_span_count, with_replacement, rng=None):
+        '''Draws count indices from range(total_span_count) (using the random generator rng, if given).'''
+        rng = self.random if rng is None else rng
         if count > total_span_count:
             count = total_span_count
         if with_replacement:
-            sampled = self.random.choices(range(total_span_count), k=count)
+            return rng.choices(range(total_span_count), k=count)
         else:
-            sampled = self.random.sample(range(total_span_count), count)
-        # correct indexes
-        if start_index > 0:
-            sampled = [i+start_index for i in sampled]
-            assert all([i <= total_span_count for i in sampled])
-        # fetch sample
-        self._cursor.execute("SELECT * FROM sampling_matrix WHERE id IN " + str(tuple(sampled)) + ';')
-        return self._cursor.fetchall()
+            return rng.sample(range(total_span_count), count)
+
+    # =====================================================================
+    #   sampling_matrix (deprecated, kept for backwards compatibility)
+    # =====================================================================
+    #   The sampling_matrix table has been replaced by the in-memory 
+    #   sampling index (see get_sampling_index). The methods below 
+    #   emulate the old interface on top of the sampling index. 
+    # =====================================================================
+
+    def sampling_matrix_table_exists(self):
+        return self._sampling_matrix is not None
+
+    def create_sampling_matrix(self, attribute_val):
+        warnings.warn('(!) create_sampling_matrix(...) is deprecated, use get_sampling_index(...) instead.', 
+                      DeprecationWarning)
+        self._sampling_matrix = self.get_sampling_index(attribute_val)
+
+    def find_sampled_indices(self, count, with_replacement):
+        '''
+        Draws count spans from the sampling matrix (see create_sampling_matrix). 
+        Returns list of rows (id, layer_id, span_index) in the order of ids, where id is 
+        the 1-based position of the span in the sampling matrix. Spans drawn several 
+        times are returned only once. 
+        Deprecated: use get_sampling_index(...) instead. 
+        '''
+        if self._sampling_matrix is None:
+            raise Exception('(!) sampling_matrix has not been created yet.')
+        layer_ids, span_indices = self._sampling_matrix
+        sampled = sorted(set(self._draw_indices(count, len(layer_ids), with_replacement)))
+        return [(i+1, int(layer_ids[i]), int(span_indices[i])) for i in sampled]
 
     def clear_sampling_matrix(self):
-        self._cursor.execute("DROP TABLE sampling_matrix;")
-        self._connection.commit()
+        self._sampling_matrix = None
@@ -1,34 +1,138 @@
 from random import Random
 from random import sample, choices
+from copy import deepcopy
+import ast
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import sqlite3
 import warnings
 
+import numpy as np
 from tqdm import tqdm
 
-from estnltk.storage.postgres import LayerQuery, IndexQuery
+from estnltk.storage.postgres import LayerQuery, IndexQuery, SliceQuery
 from estnltk.storage.postgres import PgCollection
 
 
+def find_term_locations(key, txt, term):
+    '''
+    Finds locations of the term (preceded by another word) in the given text. 
+    Returns list of rows (layer_id, attribute_value, prev_pos, startidx, endidx). 
+    '''
+    rows = []
+    txt.tag_layer()
+    for i, word in enumerate( txt.words ):
+        if term in word.lemma and i > 0:
+            prev_pos = txt.partofspeech[i-1]
+            # Note: the location stretches the whole phrase:
+            # previous word + this word (this term)
+            start = txt.words[i-1].start
+            end = word.end
+            rows.append( (key,term,prev_pos[0],start,end) )
+    return rows
+
+
+def find_term_locations_in_batch(batch, term):
+    '''
+    Finds locations of the term in a batch of (key, text) pairs. 
+    Used by worker processes of the pipelined indexing. 
+    '''
+    rows = []
+    for key, txt in batch:
+        rows.extend( find_term_locations(key, txt, term) )
+    return rows
+
+
+def find_terms_locations(key, txt, terms_set):
+    '''
+    Analyses the text once, and finds locations of all terms of terms_set (preceded by 
+    another word) in the text: lemmas of each word are looked up from the terms_set. 
+    Returns list of rows (layer_id, attribute_value, prev_pos, startidx, endidx). 
+    '''
+    rows = []
+    txt.tag_layer()
+    words = txt.words
+    for i, word in enumerate( words ):
+        if i == 0:
+            continue
+        for term in sorted( terms_set.intersection(word.lemma) ):
+            prev_pos = txt.partofspeech[i-1]
+            # Note: the location stretches the whole phrase:
+            # previous word + this word (this term)
+            rows.append( (key,term,prev_pos[0],words[i-1].start,word.end) )
+    return rows
+
+
+def find_terms_locations_in_batch(batch):
+    '''
+    Finds locations of terms in a batch of (key, text, terms_set) triples. 
+    Used by worker processes of the pipelined indexing. 
+    '''
+    rows = []
+    for key, txt, terms_set in batch:
+        rows.extend( find_terms_locations(key, txt, terms_set) )
+    return rows
+
+
+def pipelined_map(fetch_batch, batch_args, process_batch, process_args, workers, prefetch=2):
+    '''
+    Maps process_batch over batches in a pipeline: batches are fetched with 
+    fetch_batch(arg) (for each arg in batch_args) in a background thread, while 
+    fetched batches are processed with process_batch(batch, *process_args) in a 
+    pool of worker processes. Batches are fetched one at a time (so that the 
+    collection's connection is not shared between threads), and at most prefetch 
+    batches are fetched ahead. At most workers batches are being processed at a time. 
+    Yields tuples (arg, result) in the order of batch_args (deterministically). 
+    '''
+    with ThreadPoolExecutor(max_workers=1) as fetch_pool, \
+         ProcessPoolExecutor(max_workers=workers) as process_pool:
+        fetching = deque()
+        processing = deque()
+        for arg in batch_args:
+            fetching.append( (arg, fetch_pool.submit(fetch_batch, arg)) )
+            if len(fetching) > prefetch:
+                fetched_arg, future = fetching.popleft()
+                processing.append( (fetched_arg, process_pool.submit(process_batch, future.result(), *process_args)) )
+            if len(processing) > workers:
+                processed_arg, future = processing.popleft()
+                yield processed_arg, future.result()
+        while fetching:
+            fetched_arg, future = fetching.popleft()
+            processing.append( (fetched_arg, process_pool.submit(process_batch, future.result(), *process_args)) )
+        while processing:
+            processed_arg, future = processing.popleft()
+            yield processed_arg, future.result()
+
+
 class SpanSampler:
     """
     SpanSampler that creates subsamples based on partofspeech tags of words preceding (geographical) terms. 
     """
 
-    def __init__(self, collection, layer, attribute, termsfile, db_file_name='geo_terms_pos_sample.db', seed=1, verbose=False):
+    def __init__(self, collection, layer, attribute, termsfile, db_file_name='geo_terms_pos_sample.db', seed=1, verbose=False, migrate=False):
         self.verbose = verbose
         # Use local sqlite3 database for sampling
         assert isinstance(db_file_name, str)
         self._db_file_name = db_file_name
         self._connection = sqlite3.connect(self._db_file_name)
         self._cursor = self._connection.cursor()
-        # Use data from a PostgreSQL collection
-        assert isinstance(collection, PgCollection), \
+        # Cache of codes of terms and partofspeech tags (lookup table -> value -> code)
+        self._codes = {'terms': {}, 'pos_tags': {}}
+        # Use data from a PostgreSQL collection, or from any other collection that 
+        # supports select(query, layers, return_index) and provides index_query(ids) 
+        # and layer_query(layer, **attribute_values) (see common/text_collections.py)
+        assert isinstance(collection, PgCollection) or hasattr(collection, 'select'), \
             f'(!) Unexpected data type {type(collection)!r} for collection. '+\
-            f'Expected estnltk.storage.postgres.PgCollection.'
+            f'Expected estnltk.storage.postgres.PgCollection or a collection with select(...) method.'
         self.collection = collection
         self.layer = layer
         self.attribute = attribute
         self.terms = []
+        # Cache of in-memory sampling indexes (one for each set of attribute values)
+        self._sampling_index_cache = {}
+        # Sampling index selected by create_sampling_matrix (deprecated)
+        self._sampling_matrix = None
+        self.seed = seed
         self.random = Random()
         self.random.seed( seed )
         with open(termsfile, 'r', encoding='UTF-8') as in_f:
@@ -37,10 +141,38 @@ class SpanSampler:
                     self.terms.append( line.strip() )
         if self.verbose:
             print(f'Loaded {len(self.terms)} terms from {termsfile}.')
+        if self._has_legacy_schema():
+            if not migrate:
+                raise ValueError(f'(!) {self._db_file_name!r} uses the old (non-encoded) schema of attribute_locations_pos '+\
+                                 f'table. Use migrate=True to convert the database to the dictionary-encoded '+\
+                                 f'schema (note: the conversion cannot be undone, and the converted database '+\
+                                 f'cannot be used by older versions of the sampler).')
+            if self.verbose:
+                print(f'Migrating {self._db_file_name!r} to the dictionary-encoded schema.')
+            self.migrate_database()
+
+    def _index_query(self, ids):
+        if isinstance(self.collection, PgCollection):
+            return IndexQuery(ids)
+        return self.collection.index_query(ids)
+
+    def _layer_query(self, term):
+        if isinstance(self.collection, PgCollection):
+            return LayerQuery(self.layer, **{self.attribute: term})
+        return self.collection.layer_query(self.layer, **{self.attribute: term})
+
+    def _slice_query(self, start):
+        if isinstance(self.collection, PgCollection):
+            return SliceQuery(start, None)
+        return self.collection.slice_query(start)
 
     # =====================================================================
     #   attribute_locations_pos table (used as a basis for sampling)
     # =====================================================================
+    #   Terms and partofspeech tags are dictionary-encoded: the table refers 
+    #   to them by term_id and pos_id, and their strings are kept in the 
+    #   terms and pos_tags lookup tables. 
+    # =====================================================================
 
     def attribute_locations_table_exists(self):
         self._cursor.execute("""SELECT EXISTS (
@@ -51,37 +183,303 @@ class SpanSampler:
         res = self._cursor.fetchall()
         return res[0][0]
 
-    def create_attribute_locations_table(self):
-        if not self.attribute_locations_table_exists():
-            self._cursor.execute(
-                "CREATE TABLE attribute_locations_pos (layer_id integer, attribute_value varchar, prev_pos varchar, startidx integer, endidx integer);")
-            self._connection.commit()
+    def _create_tables(self):
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS terms (term_id integer PRIMARY KEY, term varchar UNIQUE NOT NULL);")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS pos_tags (pos_id integer PRIMARY KEY, pos varchar UNIQUE NOT NULL);")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS attribute_locations_pos (layer_id integer, term_id integer, pos_id integer, startidx integer, endidx integer);")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS indexing_manifest (term varchar PRIMARY KEY, last_id integer, updated_at varchar);")
+
+    def create_attribute_locations_indexes(self):
+        # (pos_id, layer_id, startidx, endidx) covers sampling queries, and 
+        # (term_id, pos_id) covers counting queries, so that these can be 
+        # answered from indexes only
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS attribute_locations_pos_pos_idx ON attribute_locations_pos (pos_id, layer_id, startidx, endidx);")
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS attribute_locations_pos_term_idx ON attribute_locations_pos (term_id, pos_id);")
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS attribute_locations_pos_layer_idx ON attribute_locations_pos (layer_id);")
+        self._connection.commit()
+
+    def _has_legacy_schema(self):
+        self._cursor.execute("PRAGMA table_info(attribute_locations_pos);")
+        return 'attribute_value' in [row[1] for row in self._cursor.fetchall()]
+
+    def migrate_database(self, vacuum=False):
+        '''
+        Migrates attribute_locations_pos table of the old schema (term strings stored in 
+        attribute_value column and partofspeech tags in prev_pos column) to the 
+        dictionary-encoded schema (codes stored in term_id and pos_id columns, strings 
+        in terms and pos_tags tables). The order of rows is preserved. 
+        If vacuum is True, then reclaims the space freed by the old table (note that 
+        vacuuming temporarily needs as much free disk space as the database takes). 
+        The migration cannot be undone: older versions of the sampler cannot read 
+        the migrated database. 
+        '''
+        if not self._has_legacy_schema():
+            return
+        self._cursor.execute("BEGIN;")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS terms (term_id integer PRIMARY KEY, term varchar UNIQUE NOT NULL);")
+        self._cursor.execute(
+            "CREATE TABLE IF NOT EXISTS pos_tags (pos_id integer PRIMARY KEY, pos varchar UNIQUE NOT NULL);")
+        self._cursor.execute(
+            "INSERT OR IGNORE INTO terms (term) SELECT DISTINCT attribute_value FROM attribute_locations_pos ORDER BY attribute_value;")
+        self._cursor.execute(
+            "INSERT OR IGNORE INTO pos_tags (pos) SELECT DISTINCT prev_pos FROM attribute_locations_pos ORDER BY prev_pos;")
+        self._cursor.execute(
+            "CREATE TABLE attribute_locations_pos_encoded (layer_id integer, term_id integer, pos_id integer, startidx integer, endidx integer);")
+        self._cursor.execute("""
+            INSERT INTO attribute_locations_pos_encoded (layer_id, term_id, pos_id, startidx, endidx) 
+            SELECT a.layer_id, t.term_id, p.pos_id, a.startidx, a.endidx 
+            FROM attribute_locations_pos AS a 
+                 JOIN terms AS t ON t.term = a.attribute_value 
+                 JOIN pos_tags AS p ON p.pos = a.prev_pos 
+            ORDER BY a.rowid;
+        """)
+        self._cursor.execute("DROP TABLE attribute_locations_pos;")
+        self._cursor.execute("ALTER TABLE attribute_locations_pos_encoded RENAME TO attribute_locations_pos;")
+        self._connection.commit()
+        self.create_attribute_locations_indexes()
+        if vacuum:
+            self._cursor.execute("VACUUM;")
+        self._codes = {'terms': {}, 'pos_tags': {}}
+        self._sampling_index_cache = {}
+
+    def _get_codes(self, lookup_table, values):
+        '''Returns dictionary mapping values of the lookup table (terms or pos_tags) to 
+           their codes. Adds missing values into the lookup table.'''
+        id_column, value_column = ('term_id', 'term') if lookup_table == 'terms' else ('pos_id', 'pos')
+        codes = self._codes[lookup_table]
+        missing = [value for value in set(values) if value not in codes]
+        if missing:
+            self._cursor.executemany(f"INSERT OR IGNORE INTO {lookup_table} ({value_column}) VALUES (?);", 
+                                     [(value,) for value in missing])
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i+500]
+                self._cursor.execute(
+                    f"SELECT {value_column}, {id_column} FROM {lookup_table} WHERE {value_column} IN (" + \
+                    ','.join('?' * len(batch)) + ");", batch)
+                codes.update( self._cursor.fetchall() )
+        return codes
+
+    def indexing_manifest_table_exists(self):
+        self._cursor.execute("""SELECT EXISTS (
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name='indexing_manifest' 
+            ORDER BY name );
+        """)
+        res = self._cursor.fetchall()
+        return res[0][0]
+
+    def get_indexing_manifest(self):
+        '''
+        Returns dictionary mapping indexed terms to the last collection id (layer_id) 
+        up to which the term has been indexed. That is, the term has been indexed in 
+        all collection texts with ids in range [0, last_id]. 
+        '''
+        if not self.indexing_manifest_table_exists():
+            return {}
+        self._cursor.execute("SELECT term, last_id FROM indexing_manifest;")
+        return dict(self._cursor.fetchall())
+
+    def _checkpoint(self, rows, terms, last_id):
+        # Insert rows and update the manifest in the same transaction, 
+        # so that the manifest always describes the contents of the table
+        term_ids = self._get_codes('terms', [row[1] for row in rows])
+        pos_ids = self._get_codes('pos_tags', [row[2] for row in rows])
+        self._cursor.executemany(
+            "INSERT INTO attribute_locations_pos (layer_id,term_id,pos_id,startidx,endidx) VALUES (?, ?, ?, ?, ?)", 
+            [(key, term_ids[term], pos_ids[prev_pos], start, end) for key, term, prev_pos, start, end in rows] )
+        self._cursor.executemany(
+            "INSERT OR REPLACE INTO indexing_manifest (term, last_id, updated_at) VALUES (?, ?, datetime('now'))", 
+            [(term, last_id) for term in terms] )
+        self._connection.commit()
+
+    def _find_term_locations(self, key, txt, term):
+        return find_term_locations(key, txt, term)
+
+    def create_attribute_locations_table(self, single_pass=True, batch_size=10000, checkpoint_texts=1000, 
+                                         workers=None, prefetch=2):
+        '''
+        Searches all terms from the collection and records their locations (along with 
+        partofspeech tags of preceding words) into the attribute_locations_pos table. 
+        If single_pass is True (default), then ids of texts containing any of the terms 
+        are queried first with a single combined query (without fetching layers), and 
+        then each candidate text is fetched and analysed (tag_layer) only once: lemmas 
+        of its words are matched against a hash set of all candidate terms of the text. Otherwise, texts are fetched and analysed 
+        separately for each term. 
+        Rows are inserted in transactions of batch_size rows (or after checkpoint_texts 
+        texts; in the single pass mode, after each checkpoint_texts texts), and indexes 
+        are created after the load. 
+        
+        Indexing is resumable and incremental: each transaction also records into the 
+        indexing_manifest table the last collection id up to which the term has been 
+        indexed. If the indexing is interrupted, or new terms are added to the terms 
+        file, or new texts are added to the collection, then calling this method again 
+        only indexes terms and texts that are missing from the manifest. 
+        Assumes that the collection yields texts in the ascending order of ids. 
+        
+        If workers > 1, then texts are processed in the pipelined mode: ids of candidate 
+        texts (as returned by the collection) are split into batches of checkpoint_texts 
+        ids, a background thread prefetches up to prefetch next batches (one at a time) 
+        while a pool of worker processes tags and matches fetched texts, and results are 
+        inserted in the order of batches (so the table contents are the same as in the 
+        serial mode). 
+        '''
+        if self.attribute_locations_table_exists() and not self.indexing_manifest_table_exists():
+            warnings.warn(f'(!) {self._db_file_name!r} already contains attribute_locations_pos table, but '+\
+                          f'no indexing manifest. Unable to resume indexing. Skipping the table creation.')
+            return
+        self._create_tables()
+        self._connection.commit()
+        self._sampling_index_cache = {}
+        manifest = self.get_indexing_manifest()
+        if self.verbose:
+            print(f'\nIndexing terms ...\n')
+        if single_pass:
+            last_ids = {term: manifest.get(term, -1) for term in self.terms}
+            self._index_terms_single_pass(last_ids, checkpoint_texts, workers, prefetch)
+            self.create_attribute_locations_indexes()
+            return
+        # The largest text id seen so far: as each term query covers the whole 
+        # collection, texts up to this id have been searched for all queried terms 
+        max_key = -1
+        for term in self.terms:
             if self.verbose:
-                print(f'\nIndexing terms ...\n')
-            for term in self.terms:
-                if self.verbose:
-                    print(f'\nSearching for term {term!r} POS combinations ...\n')
-                q = LayerQuery(self.layer, **{self.attribute: term})
-                for key, txt in tqdm(self.collection.select(query=q, layers=[self.layer])):
-                    txt.tag_layer()
-                    for i, word in enumerate( txt.words ):
-                        if term in word.lemma and i > 0:
-                            prev_pos = txt.partofspeech[i-1]
-                            # Note: the location stretches the whole phrase:
-                            # previous word + this word (this term)
-                            start = txt.words[i-1].start
-                            end = word.end
-                            self._cursor.executemany("INSERT INTO attribute_locations_pos (layer_id,attribute_value,prev_pos,startidx,endidx) VALUES (?, ?, ?, ?, ?)", \
-                                                     [(key,term,prev_pos[0],start,end)] )
-                            self._connection.commit()
+                print(f'\nSearching for term {term!r} POS combinations ...\n')
+            last_id = manifest.get(term, -1)
+            if workers is not None and workers > 1:
+                key = self._index_term_pipelined(term, last_id, checkpoint_texts, workers, prefetch)
+                max_key = max(max_key, key if key is not None else -1)
+                # Record every processed term (also terms without matches) into the manifest
+                self._checkpoint([], [term], max(max_key, last_id))
+                continue
+            rows = []
+            texts_count = 0
+            key = None
+            q = self._layer_query(term)
+            for key, txt in tqdm(self.collection.select(query=q, layers=[self.layer])):
+                if key <= last_id:
+                    # Already indexed
+                    continue
+                rows.extend( self._find_term_locations(key, txt, term) )
+                texts_count += 1
+                if len(rows) >= batch_size or texts_count >= checkpoint_texts:
+                    self._checkpoint(rows, [term], key)
+                    rows = []
+                    texts_count = 0
+            if key is not None and key > last_id:
+                self._checkpoint(rows, [term], key)
+            max_key = max(max_key, key if key is not None else -1)
+            # Record every processed term (also terms without matches) into the manifest
+            self._checkpoint([], [term], max(max_key, last_id))
+        self.create_attribute_locations_indexes()
+
+    def _any_term_query(self, terms):
+        '''Returns a query selecting texts that contain any of the terms (a disjunction 
+           of layer queries, combined as a balanced tree to keep its nesting shallow).'''
+        queries = [self._layer_query(term) for term in terms]
+        while len(queries) > 1:
+            queries = [queries[i] | queries[i+1] if i+1 < len(queries) else queries[i] \
+                       for i in range(0, len(queries), 2)]
+        return queries[0]
+
+    def _find_candidate_terms(self, last_ids):
+        '''
+        Queries ids of texts containing any of the terms with a single combined query 
+        (without fetching layers), skipping texts that have been indexed for all terms. 
+        Returns a tuple (candidates, max_key), where candidates is a dictionary mapping 
+        text ids to sets of candidate terms (terms that have not been indexed in the text 
+        yet; lemmas of the text are matched against all of them), and max_key is the 
+        largest id returned by the query (None if there were no texts). 
+        '''
+        candidates = {}
+        max_key = None
+        if not last_ids:
+            return candidates, max_key
+        resume_id = min(last_ids.values())
+        q = self._any_term_query(sorted(last_ids.keys()))
+        if resume_id >= 0:
+            q = q & self._slice_query(resume_id + 1)
+        # Thresholds where terms become candidates (in the ascending order of ids)
+        thresholds = sorted(set(last_ids.values()))
+        active_terms = frozenset()
+        for key, txt in tqdm(self.collection.select(query=q), desc='Querying term candidates'):
+            max_key = key if max_key is None else max(max_key, key)
+            while thresholds and thresholds[0] < key:
+                threshold = thresholds.pop(0)
+                active_terms = active_terms.union( term for term, last_id in last_ids.items() if last_id == threshold )
+            if active_terms:
+                candidates[key] = active_terms
+        return candidates, max_key
+
+    def _fetch_ids_with_terms(self, ids_with_terms):
+        terms_by_id = dict(ids_with_terms)
+        texts = self.collection.select(query=self._index_query(list(terms_by_id.keys())), layers=[self.layer])
+        return [(key, txt, terms_by_id[key]) for key, txt in texts]
+
+    def _index_terms_single_pass(self, last_ids, checkpoint_texts, workers=None, prefetch=2):
+        '''
+        Indexes all terms in one pass over candidate texts: each text is fetched and 
+        analysed only once (see create_attribute_locations_table). 
+        '''
+        candidates, max_key = self._find_candidate_terms(last_ids)
+        keys = sorted(candidates.keys())
+        id_batches = [[(key, candidates[key]) for key in keys[i:i+checkpoint_texts]] \
+                      for i in range(0, len(keys), checkpoint_texts)]
+        if workers is not None and workers > 1:
+            results = pipelined_map(self._fetch_ids_with_terms, id_batches, find_terms_locations_in_batch, 
+                                    (), workers, prefetch=prefetch)
         else:
-            warnings.warn(f'(!) {self._db_file_name!r} already contains attribute_locations_pos table. Skipping the table creation.')
+            results = ((ids_with_terms, find_terms_locations_in_batch(self._fetch_ids_with_terms(ids_with_terms))) \
+                       for ids_with_terms in id_batches)
+        for ids_with_terms, rows in tqdm(results, total=len(id_batches)):
+            last_key = ids_with_terms[-1][0]
+            self._checkpoint(rows, [term for term, last_id in last_ids.items() if last_id < last_key], last_key)
+        # Record every term (also terms without candidate texts) into the manifest: as the 
+        # candidate queries cover the whole collection, texts up to max_key have been searched
+        max_key = -1 if max_key is None else max_key
+        terms_by_last_id = defaultdict(list)
+        for term, last_id in last_ids.items():
+            terms_by_last_id[max(max_key, last_id)].append(term)
+        for last_id, terms in terms_by_last_id.items():
+            self._checkpoint([], terms, last_id)
+
+    def _fetch_ids(self, ids):
+        return list(self.collection.select(query=self._index_query(ids), layers=[self.layer]))
+
+    def _index_term_pipelined(self, term, last_id, batch_texts, workers, prefetch):
+        '''
+        Finds ids of texts containing the term (beyond last_id), and indexes these texts in 
+        batches of batch_texts ids in a pipeline (see pipelined_map). Results of each batch 
+        are inserted (along with the manifest update) by the current process in one transaction. 
+        Returns the largest id of texts returned by the term query (or None, if there were none). 
+        '''
+        q = self._layer_query(term)
+        # Only fetch ids of texts (without layers)
+        all_keys = [key for key, txt in self.collection.select(query=q)]
+        keys = [key for key in all_keys if key > last_id]
+        id_batches = [keys[i:i+batch_texts] for i in range(0, len(keys), batch_texts)]
+        results = pipelined_map(self._fetch_ids, id_batches, find_term_locations_in_batch, 
+                                (term,), workers, prefetch=prefetch)
+        for ids, rows in tqdm(results, total=len(id_batches)):
+            self._checkpoint(rows, [term], ids[-1])
+        return max(all_keys, default=None)
 
     # Find counts of all attribute values
     def get_attribute_counts(self):
         if not self.attribute_locations_table_exists():
             raise Exception('(!) attribute_locations_pos table has not been generated yet.')
-        self._cursor.execute("SELECT attribute_value, COUNT(attribute_value) FROM attribute_locations_pos GROUP BY attribute_value;")
+        self._cursor.execute("""
+        SELECT t.term, c.count FROM (
+            SELECT term_id, COUNT(*) AS count FROM attribute_locations_pos GROUP BY term_id 
+        ) AS c JOIN terms AS t ON t.term_id = c.term_id ORDER BY t.term;
+        """)
         return self._cursor.fetchall()
 
     # Find counts of tuples (prev_pos, attribute_value)
@@ -89,10 +487,28 @@ class SpanSampler:
         if not self.attribute_locations_table_exists():
             raise Exception('(!) attribute_locations_pos table has not been generated yet.')
         self._cursor.execute("""
-        SELECT prev_pos,attribute_value,COUNT(*) FROM attribute_locations_pos GROUP BY attribute_value,prev_pos;
+        SELECT p.pos, t.term, c.count FROM (
+            SELECT term_id, pos_id, COUNT(*) AS count FROM attribute_locations_pos GROUP BY term_id, pos_id 
+        ) AS c JOIN terms AS t ON t.term_id = c.term_id JOIN pos_tags AS p ON p.pos_id = c.pos_id 
+        ORDER BY t.term, p.pos;
         """)
         return self._cursor.fetchall()
 
+    # Find counts of prev_pos values (subpopulations of the benchmark)
+    def get_pos_counts(self):
+        if not self.attribute_locations_table_exists() or not self._table_exists('pos_tags'):
+            raise Exception('(!) attribute_locations_pos table has not been generated yet.')
+        self._cursor.execute("""
+        SELECT p.pos, c.count FROM (
+            SELECT pos_id, COUNT(*) AS count FROM attribute_locations_pos GROUP BY pos_id 
+        ) AS c JOIN pos_tags AS p ON p.pos_id = c.pos_id ORDER BY p.pos;
+        """)
+        return dict( self._cursor.fetchall() )
+
+    def _table_exists(self, table_name):
+        self._cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
+        return len(self._cursor.fetchall()) > 0
+
     # Find all distinct layer_id-s annotated by attributes/spans
     def get_attribute_layer_ids(self, normalize=True):
         if not self.attribute_locations_table_exists():
@@ -106,74 +522,175 @@ class SpanSampler:
 
     def clear_attribute_locations(self):
         self._cursor.execute("DROP TABLE attribute_locations_pos;")
+        self._sampling_index_cache = {}
+        self._cursor.execute("DROP TABLE IF EXISTS indexing_manifest;")
+        self._cursor.execute("DROP TABLE IF EXISTS terms;")
+        self._cursor.execute("DROP TABLE IF EXISTS pos_tags;")
+        self._codes = {'terms': {}, 'pos_tags': {}}
         self._connection.commit()
 
     # =====================================================================
-    #   sampling_matrix table (temporary, used only during sampling)
+    #   in-memory sampling index (used during sampling)
     # =====================================================================
 
-    def sampling_matrix_table_exists(self):
-        self._cursor.execute("""SELECT EXISTS (
-            SELECT name FROM sqlite_master
-            WHERE type='table' AND name='sampling_matrix' 
-            ORDER BY name );
-        """)
-        res = self._cursor.fetchall()
-        return res[0][0]
+    @staticmethod
+    def _normalize_attribute_values(attribute_values):
+        # For backwards compatibility, also allow SQL-formatted tuple strings, e.g. "('A')"
+        if isinstance(attribute_values, str):
+            try:
+                attribute_values = ast.literal_eval(attribute_values)
+            except (ValueError, SyntaxError):
+                pass
+        if isinstance(attribute_values, str):
+            attribute_values = (attribute_values,)
+        return tuple(sorted(set(attribute_values)))
 
-    def create_sampling_matrix(self, attribute_val):
-        self._cursor.execute("CREATE TABLE sampling_matrix (id INTEGER PRIMARY KEY AUTOINCREMENT, layer INTEGER, startidx INTEGER, endidx INTEGER, prev_pos VARCHAR);")
-        self._cursor.execute(
-            "INSERT INTO sampling_matrix (layer,startidx,endidx,prev_pos) SELECT layer_id as layer, startidx, endidx, prev_pos FROM attribute_locations_pos WHERE prev_pos IN " + str(
-                attribute_val) + ";")
-        self._connection.commit()
+    def get_sampling_index(self, attribute_values, batch_size=500):
+        '''
+        Returns in-memory sampling index of locations of prev_pos values (attribute_values): 
+        a tuple of NumPy arrays (layer_ids, startidx, endidx, prev_pos), in the order of 
+        rows of the attribute_locations_pos table. Indexes are cached for each set of values. 
+        '''
+        values = self._normalize_attribute_values(attribute_values)
+        if values not in self._sampling_index_cache:
+            rows = []
+            for i in range(0, len(values), batch_size):
+                batch = values[i:i+batch_size]
+                self._cursor.execute(
+                    "SELECT a.rowid, a.layer_id, a.startidx, a.endidx, p.pos FROM attribute_locations_pos AS a "+\
+                    "JOIN pos_tags AS p ON p.pos_id = a.pos_id WHERE a.pos_id IN "+\
+                    "(SELECT pos_id FROM pos_tags WHERE pos IN (" + ','.join('?' * len(batch)) + "));", batch)
+                rows.extend( self._cursor.fetchall() )
+            rows.sort()
+            self._sampling_index_cache[values] = \
+                (np.array([row[1] for row in rows], dtype=np.int64), 
+                 np.array([row[2] for row in rows], dtype=np.int32), 
+                 np.array([row[3] for row in rows], dtype=np.int32), 
+                 np.array([row[4] for row in rows], dtype=str))
+        return self._sampling_index_cache[values]
 
     def __call__(self, count, attribute_values, return_index=False, with_replacement=True):
         '''
         Samples given amount of spans that meet given conditions (satisfy attribute_values). 
         If with_replacement is True (default) then same span can be sampled several times. 
-        If return_index is True than adds text_ids to the results (default: False).
-        Returns list of type (Text, span) or (int, Text, span).
+        If return_index is True than adds the index of each sampled span to the results 
+        (default: False): its 1-based position in the sampling matrix of attribute_values 
+        (see get_sampling_index), as in find_sampled_indices. 
+        Returns list of type (Text, span) or (int, Text, span), in the order of draws, 
+        where span is a tuple (text_id, startidx, endidx, prev_pos). 
+        If the same text is drawn several times, then each draw gets a separate copy 
+        of the Text object. 
         '''
         if not self.attribute_locations_table_exists():
             self.create_attribute_locations_table()
-        if self.sampling_matrix_table_exists():
-            self.clear_sampling_matrix()
-        self.create_sampling_matrix(attribute_values)
-        indices = self.find_sampled_indices(count, with_replacement)
+        sampling_index = self.get_sampling_index(attribute_values)
+        sampled = self._draw_indices(count, len(sampling_index[0]), with_replacement)
+        texts = self._fetch_texts(sampling_index[0][sampled])
+        return self._make_results(sampling_index, sampled, texts, set(), return_index)
+
+    def _fetch_texts(self, layer_ids):
+        sampled_ids = sorted(set(layer_ids.tolist()))
+        return dict(self.collection.select(query=self._index_query(sampled_ids), layers=[self.layer], return_index=True))
+
+    def _make_results(self, sampling_index, sampled, texts, used_ids, return_index):
+        # If the same text is used several times, then each use gets a separate copy of the Text object.
+        # The index of a span is its 1-based position in the sampling matrix (as in find_sampled_indices)
+        layer_ids, starts, ends, prev_pos = sampling_index
         result_list = []
-        only_txt_index = [idx[1] for idx in indices]
-        texts = list(self.collection.select( query=IndexQuery(only_txt_index),layers=[self.layer],return_index=True ))
-        for text in texts:
-            idx = [index for index in indices if text[0] == index[1]][0]
+        for i in sampled:
+            text_id = int(layer_ids[i])
+            text = texts[text_id] if text_id not in used_ids else deepcopy(texts[text_id])
+            used_ids.add(text_id)
+            span = (text_id, int(starts[i]), int(ends[i]), str(prev_pos[i]))
             if return_index:
-                result_list.append((idx[0],text[1],idx[1:]))
+                result_list.append((int(i)+1, text, span))
             else:
-                result_list.append((text[1],idx[1:]))
+                result_list.append((text, span))
         return result_list
 
-    def find_sampled_indices(self, count, with_replacement):
-        # find sample size
-        self._cursor.execute("SELECT COUNT(*) FROM sampling_matrix;")
-        total_span_count = self._cursor.fetchall()[0][0]
-        # find matrix starting index
-        self._cursor.execute("SELECT * FROM sampling_matrix LIMIT 1;")
-        start_index = self._cursor.fetchall()[0][0]
-        # draw sample
+    def sample_strata(self, strata, return_index=False, with_replacement=True, deduplicate=True):
+        '''
+        Samples several populations (strata) at once. strata is a dictionary mapping 
+        population name to a tuple (count, attribute_values), e.g. 
+        {'levinumad': (1000, levinumad_terms), 'ulejaanud': (1000, ulejaanud_terms)}. 
+        
+        Each stratum is drawn from the in-memory sampling index with its own random 
+        stream, which is seeded by the sampler's seed and the name of the population. 
+        So, the sample of a population does not depend on other strata nor on the 
+        earlier calls of the sampler. All sampled texts are fetched from the collection 
+        with a single query. 
+        
+        If deduplicate is True (default), then a sentence (text) sampled in one stratum 
+        is excluded from the strata that follow it (in the order of the dictionary), so 
+        that each sentence ends up in at most one stratum. Note that this makes the 
+        samples of the following strata dependent on the preceding ones. 
+        
+        Returns a dictionary mapping each population to a list of type (Text, span) or 
+        (int, Text, span), in the order of draws, where span is a tuple (text_id, startidx, 
+        endidx, prev_pos) (as in __call__).
+        '''
+        if not self.attribute_locations_table_exists():
+            self.create_attribute_locations_table()
+        draws = {}
+        used_layer_ids = []
+        for population, (count, attribute_values) in strata.items():
+            sampling_index = self.get_sampling_index(attribute_values)
+            rng = Random(f'{self.seed}:{population}')
+            if deduplicate and len(used_layer_ids) > 0:
+                candidates = np.flatnonzero( ~np.isin(sampling_index[0], np.concatenate(used_layer_ids)) )
+                sampled = candidates[self._draw_indices(count, len(candidates), with_replacement, rng=rng)]
+            else:
+                sampled = np.array(self._draw_indices(count, len(sampling_index[0]), with_replacement, rng=rng), 
+                                   dtype=np.int64)
+            used_layer_ids.append( np.unique(sampling_index[0][sampled]) )
+            draws[population] = (sampling_index, sampled)
+        sampled_layer_ids = np.unique( np.concatenate(used_layer_ids) if used_layer_ids else np.array([], dtype=np.int64) )
+        if self.verbose:
+            print(f'Fetching {len(sampled_layer_ids)} sampled texts ...')
+        texts = self._fetch_texts( sampled_layer_ids )
+        used_ids = set()
+        return {population: self._make_results(sampling_index, sampled, texts, used_ids, return_index) 
+                 for population, (sampling_index, sampled) in draws.items()}
+
+    def _draw_indices(self, count, total_span_count, with_replacement, rng=None):
+        '''Draws count indices from range(total_span_count) (using the random generator rng, if given).'''
+        rng = self.random if rng is None else rng
         if count > total_span_count:
             count = total_span_count
         if with_replacement:
-            sampled = self.random.choices(range(total_span_count), k=count)
+            return rng.choices(range(total_span_count), k=count)
         else:
-            sampled = self.random.sample(range(total_span_count), count)
-        # correct indexes
-        if start_index > 0:
-            sampled = [i+start_index for i in sampled]
-            assert all([i <= total_span_count for i in sampled])
-        # fetch sample
-        self._cursor.execute("SELECT * FROM sampling_matrix WHERE id IN " + str(tuple(sampled)) + ';')
-        return self._cursor.fetchall()
+            return rng.sample(range(total_span_count), count)
+
+    # =====================================================================
+    #   sampling_matrix (deprecated, kept for backwards compatibility)
+    # =====================================================================
+    #   The sampling_matrix table has been replaced by the in-memory 
+    #   sampling index (see get_sampling_index). The methods below 
+    #   emulate the old interface on top of the sampling index. 
+    # =====================================================================
+
+    def sampling_matrix_table_exists(self):
+        return self._sampling_matrix is not None
+
+    def create_sampling_matrix(self, attribute_val):
+        warnings.warn('(!) create_sampling_matrix(...) is deprecated, use get_sampling_index(...) instead.', 
+                      DeprecationWarning)
+        self._sampling_matrix = self.get_sampling_index(attribute_val)
+
+    def find_sampled_indices(self, count, with_replacement):
+        '''
+        Draws count spans from the sampling matrix (see create_sampling_matrix). 
+        Returns list of rows (id, layer_id, startidx, endidx, prev_pos) in the order of ids, where id is 
+        the 1-based position of the span in the sampling matrix. Spans drawn several 
+        times are returned only once. 
+        Deprecated: use get_sampling_index(...) instead. 
+        '''
+        if self._sampling_matrix is None:
+            raise Exception('(!) sampling_matrix has not been created yet.')
+        layer_ids, starts, ends, prev_pos = self._sampling_matrix
+        sampled = sorted(set(self._draw_indices(count, len(layer_ids), with_replacement)))
+        return [(i+1, int(layer_ids[i]), int(starts[i]), int(ends[i]), str(prev_pos[i])) for i in sampled]
 
     def clear_sampling_matrix(self):
-        self._cursor.execute("DROP TABLE sampling_matrix;")
-        self._connection.commit()
+        self._sampling_matrix = None
@@ -1,14 +1,140 @@
+from typing import Optional, Tuple
+
 import numpy as np
-from numpy.typing import NDArray
+from numpy.typing import NDArray, ArrayLike
 
 def balance_sample_sizes(Lambda: NDArray[float], expected_sample_count: int) -> NDArray[int]:
     """
     Returns optimal sample sizes for sub-populations given frequencies of the sub-populations.
-    The total number of samples approximately matches the expected sample count.
+    The total number of samples matches the expected sample count exactly (see round_to_total).
 
     Sample sizes are computed to minimise the variance of an event proportion over the  entire
     population provided that the event probilities in sub-populations are roughly equal.
     In the recall setting, all positive cases are split into sub-populations and the event
     marks the fact that an algorithm accepts the positive case.
     """
-    return np.round(Lambda/sum(Lambda) * expected_sample_count).astype(int)
+    return round_to_total(Lambda/sum(Lambda) * expected_sample_count, expected_sample_count)
+
+
+def round_to_total(quotas: ArrayLike, total: ArrayLike) -> NDArray[int]:
+    """
+    Rounds non-negative quotas to integers that sum up exactly to the total, following the
+    largest remainder method: quotas are rounded down and the remaining units are given to
+    quotas with the largest fractional parts (ties are resolved in favour of larger quotas).
+
+    Quotas can be a matrix of shape (allocations, sub-populations), in which case each row
+    is rounded to the corresponding element of the total vector.
+    """
+    quotas = np.asarray(quotas, dtype=float)
+    total = np.asarray(total, dtype=np.int64)
+    floors = np.floor(quotas + 1e-9)
+    remainders = np.clip(quotas - floors, 0.0, None)
+    missing = total - floors.sum(axis=-1).astype(np.int64)
+    if np.any(missing < 0) or np.any(missing > quotas.shape[-1]):
+        raise ValueError(f'(!) Quotas do not sum up to the total {total!r}.')
+    # Rank sub-populations by remainders (and by quotas on ties), largest first
+    order = np.lexsort((-quotas, -remainders), axis=-1)
+    ranks = np.argsort(order, axis=-1)
+    return (floors + (ranks < np.expand_dims(missing, -1))).astype(np.int64)
+
+
+def neyman_allocation(Lambda: ArrayLike, recalls: ArrayLike, expected_sample_count: ArrayLike,
+                      min_sample_size: int = 1, recall_bound: float = 0.01) -> NDArray[int]:
+    """
+    Returns sample sizes for sub-populations that minimise the variance of the recall estimate
+    (Neyman allocation) given frequencies of the sub-populations and pilot estimates of their
+    recalls. The total number of samples matches the expected sample count exactly.
+
+    The sample size of the i-th sub-population is proportional to Lambda_i*sqrt(p_i*(1-p_i)),
+    where p_i is the pilot recall clipped into [recall_bound, 1-recall_bound], so that
+    sub-populations with (nearly) perfect pilot recalls are not left out. Each sub-population
+    gets at least min_sample_size samples, and the rest is divided as above.
+
+    If expected_sample_count is a vector, then returns a matrix with one allocation per each
+    expected sample count.
+    """
+    Lambda = np.asarray(Lambda, dtype=float)
+    recalls = np.clip(np.asarray(recalls, dtype=float), recall_bound, 1-recall_bound)
+    if Lambda.shape != recalls.shape:
+        raise ValueError(f'(!) Frequencies and recalls have different shapes: {Lambda.shape} vs {recalls.shape}.')
+    expected_sample_count = np.asarray(expected_sample_count, dtype=np.int64)
+    free_count = expected_sample_count - min_sample_size * len(Lambda)
+    if np.any(free_count < 0):
+        raise ValueError(f'(!) Expected sample count is too small for {len(Lambda)} sub-populations '+\
+                         f'with at least {min_sample_size} samples.')
+    shares = Lambda * np.sqrt(recalls * (1-recalls))
+    shares = shares/shares.sum()
+    quotas = min_sample_size + np.expand_dims(free_count, -1) * shares
+    return round_to_total(quotas, expected_sample_count)
+
+
+def simulate_ci_widths(allocations: ArrayLike, Lambda: ArrayLike, recalls: ArrayLike,
+                       n_simulations: int = 1000, seed: Optional[int] = None) -> Tuple[NDArray[float], NDArray[float]]:
+    """
+    Estimates the expected width of the 95% confidence interval of the recall estimate (as
+    computed by find_recall_estimate with the default method) for a batch of allocations by
+    Monte Carlo simulation.
+
+    Allocations is a matrix of sample sizes (of positive cases) of shape (allocations,
+    sub-populations). In each simulation, the number of correctly recalled cases of each
+    sub-population is drawn from the binomial distribution given the sample size and the
+    (assumed) recall of the sub-population. All allocations and simulations are evaluated
+    at once.
+
+    Returns a tuple of vectors (expected widths, coverages), where coverage is the share of
+    simulations in which the confidence interval contained the true recall.
+    """
+    allocations = np.atleast_2d(np.asarray(allocations, dtype=np.int64))
+    Lambda = np.asarray(Lambda, dtype=float)
+    Lambda = Lambda/Lambda.sum()
+    recalls = np.asarray(recalls, dtype=float)
+    if allocations.shape[-1] != len(Lambda) or Lambda.shape != recalls.shape:
+        raise ValueError(f'(!) Allocations, frequencies and recalls have mismatching shapes: '+\
+                         f'{allocations.shape}, {Lambda.shape} and {recalls.shape}.')
+    if np.any(allocations < 1):
+        raise ValueError('(!) Each sub-population needs at least one sample in all allocations.')
+    rng = np.random.default_rng(seed)
+    # Correct counts of shape (simulations, allocations, sub-populations)
+    correct_counts = rng.binomial(allocations, recalls, size=(n_simulations,) + allocations.shape)
+    estimates = np.sum(correct_counts * (Lambda/allocations), axis=-1)
+    # Sum of squared item weights: each of n_i items of a sub-population has weight Lambda_i/n_i
+    squared_weights = np.sum(np.square(Lambda)/allocations, axis=-1)
+    half_widths = 1.96 * np.sqrt(estimates * (1-estimates) * squared_weights)
+    true_recall = np.dot(Lambda, recalls)
+    coverages = np.mean(np.abs(estimates - true_recall) <= half_widths, axis=0)
+    return np.mean(2 * half_widths, axis=0), coverages
+
+
+def plan_sample_sizes(Lambda: ArrayLike, recalls: ArrayLike, target_ci_width: float,
+                      max_sample_count: int = 10000, step: int = 10, min_sample_size: int = 1,
+                      allocation: str = 'proportional', n_simulations: int = 1000,
+                      seed: Optional[int] = None) -> Tuple[NDArray[int], float]:
+    """
+    Finds the smallest total sample count (from the grid min_sample_size*k, ...,
+    max_sample_count with the given step) for which the allocation reaches the expected
+    confidence interval width target_ci_width in the simulation (see simulate_ci_widths).
+
+    Allocation is either 'proportional' (default, see balance_sample_sizes) or 'neyman'
+    (see neyman_allocation). Note that the confidence interval of find_recall_estimate is
+    based on the pooled variance of the estimate, so its width is minimised by the
+    proportional allocation, which thus needs fewer samples to reach the target. The Neyman
+    allocation minimises the actual variance of the estimate (and yields more conservative
+    intervals).
+
+    Returns a tuple (allocation, expected CI width). If the target cannot be reached,
+    then returns the allocation of max_sample_count.
+    """
+    recalls = np.asarray(recalls, dtype=float)
+    min_sample_size = max(min_sample_size, 1)
+    start = min_sample_size * len(recalls)
+    totals = np.unique(np.append(np.arange(start, max_sample_count, step), max_sample_count))
+    if allocation == 'neyman':
+        allocations = neyman_allocation(Lambda, recalls, totals, min_sample_size=min_sample_size)
+    elif allocation == 'proportional':
+        allocations = neyman_allocation(Lambda, np.full(len(recalls), 0.5), totals, min_sample_size=min_sample_size)
+    else:
+        raise ValueError(f"(!) Unexpected allocation={allocation!r}. Supported allocations: ['neyman', 'proportional']")
+    widths, _ = simulate_ci_widths(allocations, Lambda, recalls, n_simulations=n_simulations, seed=seed)
+    reached = np.flatnonzero(widths <= target_ci_width)
+    best = reached[0] if len(reached) > 0 else len(totals) - 1
+    return allocations[best], float(widths[best])
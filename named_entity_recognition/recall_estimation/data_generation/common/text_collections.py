@@ -0,0 +1,349 @@
+'''
+Text collections that can be used by span samplers in place of PgCollection. 
+
+Samplers use collections through a duck-typed interface: 
+* select(query=None, layers=None, return_index=True) -- yields (collection_id, Text) 
+  pairs (or Text objects if return_index is False) in the ascending order of ids; 
+* index_query(ids), slice_query(start, stop=None) and layer_query(layer, **attribute_values) 
+  -- construct queries for selecting texts by ids, by a range of ids (start <= id < stop) 
+  and by layer's attribute values; queries can be combined with & (and) and | (or), as 
+  estnltk's queries; 
+* __len__() -- number of texts in the collection; 
+
+PgCollection-s are used by samplers directly (with estnltk's IndexQuery, SliceQuery and 
+LayerQuery), other collections should implement the interface above. 
+'''
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from estnltk.converters import text_to_json, json_to_text
+from estnltk.storage.postgres import PgCollection
+from estnltk.storage.postgres import IndexQuery as PgIndexQuery
+from estnltk.storage.postgres import LayerQuery as PgLayerQuery
+from estnltk.storage.postgres.queries.slice_query import SliceQuery as PgSliceQuery
+
+
+class LocalQuery:
+    '''
+    Base class of local queries. Queries can be combined with & and | operators.
+    '''
+    def __and__(self, other):
+        return LocalAndQuery(self, other)
+
+    def __or__(self, other):
+        return LocalOrQuery(self, other)
+
+    def matches(self, text_id, text):
+        raise NotImplementedError()
+
+    def min_id(self):
+        '''Returns the smallest id that the query can select (None if not bounded).'''
+        return None
+
+
+class LocalAndQuery(LocalQuery):
+    def __init__(self, left, right):
+        self.left, self.right = left, right
+
+    def matches(self, text_id, text):
+        return self.left.matches(text_id, text) and self.right.matches(text_id, text)
+
+    def min_id(self):
+        bounds = [bound for bound in (self.left.min_id(), self.right.min_id()) if bound is not None]
+        return max(bounds) if bounds else None
+
+
+class LocalOrQuery(LocalQuery):
+    def __init__(self, left, right):
+        self.left, self.right = left, right
+
+    def matches(self, text_id, text):
+        return self.left.matches(text_id, text) or self.right.matches(text_id, text)
+
+    def min_id(self):
+        bounds = (self.left.min_id(), self.right.min_id())
+        return None if None in bounds else min(bounds)
+
+
+class LocalIndexQuery(LocalQuery):
+    '''
+    Selects texts by collection ids (counterpart of estnltk.storage.postgres.IndexQuery).
+    '''
+    def __init__(self, ids):
+        self.ids = sorted(set(int(i) for i in ids))
+        self._id_set = set(self.ids)
+
+    def matches(self, text_id, text):
+        return text_id in self._id_set
+
+    def min_id(self):
+        return self.ids[0] if self.ids else None
+
+
+class LocalSliceQuery(LocalQuery):
+    '''
+    Selects texts with ids in range start <= id < stop (counterpart of estnltk's SliceQuery). 
+    If start or stop is None, then the range is not bounded from that side.
+    '''
+    def __init__(self, start, stop=None):
+        self.start = start
+        self.stop = stop
+
+    def matches(self, text_id, text):
+        return (self.start is None or text_id >= self.start) and (self.stop is None or text_id < self.stop)
+
+    def min_id(self):
+        return self.start
+
+
+class LocalLayerQuery(LocalQuery):
+    '''
+    Selects texts which layer contains an annotation with the given attribute values
+    (counterpart of estnltk.storage.postgres.LayerQuery).
+    '''
+    def __init__(self, layer, **attribute_values):
+        self.layer = layer
+        self.attribute_values = attribute_values
+
+    def matches(self, text_id, text):
+        if self.layer not in text.layers:
+            return False
+        for span in text[self.layer]:
+            for annotation in span.annotations:
+                if all(annotation[attr] == value for attr, value in self.attribute_values.items()):
+                    return True
+        return False
+
+
+class SQLiteTextCollection:
+    '''
+    Local text collection stored in a SQLite database: each text is stored (along with
+    its layers) in the estnltk's JSON format under its collection id. The collection can
+    be filled from a JSONL file (see import_jsonl) or from other collections (see insert).
+
+    Note that select(...) returns texts with all stored layers, regardless of the layers
+    argument. Queries other than index queries are evaluated by scanning the stored texts
+    (starting from the smallest id that the query can select).
+    '''
+
+    def __init__(self, db_file_name, timeout=60.0):
+        self._db_file_name = db_file_name
+        # The connection is shared by threads prefetching texts, so access is serialized by the lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_file_name, timeout=timeout, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS texts (id INTEGER PRIMARY KEY, data TEXT NOT NULL);")
+
+    def insert(self, texts, batch_size=1000):
+        '''
+        Inserts (collection_id, Text) pairs into the collection, replacing existing texts
+        with the same ids.
+        '''
+        batch = []
+        for text_id, text in texts:
+            batch.append( (int(text_id), text_to_json(text)) )
+            if len(batch) >= batch_size:
+                self._insert_rows(batch)
+                batch = []
+        self._insert_rows(batch)
+
+    def _insert_rows(self, rows):
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO texts (id, data) VALUES (?, ?);", rows)
+
+    def import_jsonl(self, jsonl_file, batch_size=1000):
+        '''
+        Imports texts from a JSONL file, where each line is a JSON object with keys "id"
+        (collection id) and "text" (Text in the estnltk's JSON format, as a string or an object).
+        '''
+        def iter_lines():
+            with open(jsonl_file, 'r', encoding='utf-8') as in_f:
+                for line in in_f:
+                    if len(line.strip()) > 0:
+                        item = json.loads(line)
+                        text = item['text']
+                        yield item['id'], json_to_text(text if isinstance(text, str) else json.dumps(text))
+        self.insert(iter_lines(), batch_size=batch_size)
+
+    def export_jsonl(self, jsonl_file):
+        '''Exports all texts of the collection into a JSONL file (see import_jsonl).'''
+        with open(jsonl_file, 'w', encoding='utf-8') as out_f:
+            for text_id, data in self._iter_all_rows():
+                out_f.write(json.dumps({'id': text_id, 'text': data}, ensure_ascii=False) + '\n')
+
+    def _iter_all_rows(self, batch_size=1000, start_id=None):
+        # Iterate over all rows (with ids >= start_id) in batches (keyset pagination by id)
+        last_id = None
+        while True:
+            with self._lock:
+                if last_id is None and start_id is None:
+                    rows = self._connection.execute("SELECT id, data FROM texts ORDER BY id LIMIT ?;",
+                                                    (batch_size,)).fetchall()
+                elif last_id is None:
+                    rows = self._connection.execute("SELECT id, data FROM texts WHERE id >= ? ORDER BY id LIMIT ?;",
+                                                    (start_id, batch_size)).fetchall()
+                else:
+                    rows = self._connection.execute("SELECT id, data FROM texts WHERE id > ? ORDER BY id LIMIT ?;",
+                                                    (last_id, batch_size)).fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1][0]
+
+    def select(self, query=None, layers=None, return_index=True):
+        if isinstance(query, LocalIndexQuery):
+            def iter_rows(batch_size=500):
+                for i in range(0, len(query.ids), batch_size):
+                    batch = query.ids[i:i+batch_size]
+                    with self._lock:
+                        rows = self._connection.execute(
+                            f"SELECT id, data FROM texts WHERE id IN ({','.join('?' * len(batch))}) ORDER BY id;",
+                            batch).fetchall()
+                    yield from rows
+            rows = iter_rows()
+        elif query is None or isinstance(query, LocalQuery):
+            rows = self._iter_all_rows(start_id=query.min_id() if query is not None else None)
+        else:
+            raise TypeError(f'(!) Unsupported query type {type(query)!r} for {self.__class__.__name__}.')
+        for text_id, data in rows:
+            text = json_to_text(data)
+            if isinstance(query, LocalQuery) and not query.matches(text_id, text):
+                continue
+            yield (text_id, text) if return_index else text
+
+    def index_query(self, ids):
+        return LocalIndexQuery(ids)
+
+    def slice_query(self, start, stop=None):
+        return LocalSliceQuery(start, stop)
+
+    def layer_query(self, layer, **attribute_values):
+        return LocalLayerQuery(layer, **attribute_values)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM texts;").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
+class CachedCollection:
+    '''
+    Wraps a (remote) collection with an on-disk LRU cache of fetched Text objects.
+
+    Texts selected by index queries are looked up from the cache (keyed by collection id
+    and requested layers), and only missing texts are fetched from the underlying collection.
+    Other queries are passed to the underlying collection. The total size of cached texts
+    is bounded by max_size_mb: if the limit is exceeded, the least recently used texts
+    are evicted.
+    '''
+
+    def __init__(self, collection, cache_dir='.text_cache', max_size_mb=1024, timeout=60.0):
+        self.collection = collection
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(cache_dir, 'texts.db'), timeout=timeout,
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL;")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS texts (id INTEGER NOT NULL, layers TEXT NOT NULL, data TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL, PRIMARY KEY (id, layers));")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS texts_access_idx ON texts (last_access);")
+
+    def _inner_query(self, query):
+        # Translate local queries into queries of the underlying collection
+        if isinstance(query, LocalAndQuery):
+            return self._inner_query(query.left) & self._inner_query(query.right)
+        if isinstance(query, LocalOrQuery):
+            return self._inner_query(query.left) | self._inner_query(query.right)
+        if isinstance(self.collection, PgCollection):
+            if isinstance(query, LocalIndexQuery):
+                return PgIndexQuery(query.ids)
+            if isinstance(query, LocalSliceQuery):
+                return PgSliceQuery(query.start, query.stop)
+            if isinstance(query, LocalLayerQuery):
+                return PgLayerQuery(query.layer, **query.attribute_values)
+            return query
+        if isinstance(query, LocalIndexQuery):
+            return self.collection.index_query(query.ids)
+        if isinstance(query, LocalSliceQuery):
+            return self.collection.slice_query(query.start, query.stop)
+        if isinstance(query, LocalLayerQuery):
+            return self.collection.layer_query(query.layer, **query.attribute_values)
+        return query
+
+    def select(self, query=None, layers=None, return_index=True):
+        if not isinstance(query, LocalIndexQuery):
+            yield from self.collection.select(query=self._inner_query(query), layers=layers, return_index=return_index)
+            return
+        layers_key = json.dumps(sorted(layers) if layers is not None else None)
+        texts = self._get_many(query.ids, layers_key)
+        missing_ids = [text_id for text_id in query.ids if text_id not in texts]
+        if missing_ids:
+            fetched = dict(self.collection.select(query=self._inner_query(LocalIndexQuery(missing_ids)),
+                                                  layers=layers, return_index=True))
+            self._put_many(fetched, layers_key)
+            texts.update(fetched)
+        for text_id in query.ids:
+            if text_id in texts:
+                yield (text_id, texts[text_id]) if return_index else texts[text_id]
+
+    def _get_many(self, ids, layers_key, batch_size=500):
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i+batch_size]
+                for text_id, data in self._connection.execute(
+                        f"SELECT id, data FROM texts WHERE layers = ? AND id IN ({','.join('?' * len(batch))});",
+                        (layers_key, *batch)):
+                    found[text_id] = json_to_text(data)
+            if found:
+                with self._connection:
+                    self._connection.executemany("UPDATE texts SET last_access = ? WHERE id = ? AND layers = ?;",
+                                                 [(time.time(), text_id, layers_key) for text_id in found])
+        return found
+
+    def _put_many(self, texts, layers_key):
+        rows = []
+        for text_id, text in texts.items():
+            data = text_to_json(text)
+            rows.append( (int(text_id), layers_key, data, len(data.encode('utf-8')), time.time()) )
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO texts (id, layers, data, size, last_access) VALUES (?, ?, ?, ?, ?);", rows)
+            self._evict()
+
+    def _evict(self):
+        # Delete the least recently used texts until the cache fits into max_size_bytes
+        total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM texts;").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        to_delete = []
+        for text_id, layers_key, size in self._connection.execute(
+                "SELECT id, layers, size FROM texts ORDER BY last_access;"):
+            if total_size <= self.max_size_bytes:
+                break
+            to_delete.append( (text_id, layers_key) )
+            total_size -= size
+        self._connection.executemany("DELETE FROM texts WHERE id = ? AND layers = ?;", to_delete)
+
+    def index_query(self, ids):
+        return LocalIndexQuery(ids)
+
+    def slice_query(self, start, stop=None):
+        return LocalSliceQuery(start, stop)
+
+    def layer_query(self, layer, **attribute_values):
+        return LocalLayerQuery(layer, **attribute_values)
+
+    def __len__(self):
+        return len(self.collection)
+
+    def close(self):
+        self._connection.close()